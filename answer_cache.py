@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent answer cache for Claude responses
+Claude回答的持久化缓存
+
+Answers are stored in SQLite, keyed by the normalized question, language,
+model name, prompt version and the sorted chunk_ids sent as context. Rows
+are scoped to a corpus version and also record their context chunk_ids.
+Only rows of the open version are read, so a book update invalidates all
+cached answers without touching the rows of other processes or corpora
+sharing the file; those age out through the TTL and LRU eviction (beyond
+max_entries). When the cache is opened with the change set of a delta
+build (see ingest_pdf.py), answers from the previous version whose chunks
+were neither modified nor removed are copied to the new version. WAL mode
+lets several Streamlit workers share the file.
+回答存储在SQLite中，键为规范化问题、语言、模型名、提示词版本和排序后的上下文
+chunk_id。记录按语料版本区分，并记录其上下文 chunk_id。只读取当前版本的记录，
+因此书籍更新后所有缓存回答自动失效，而不会影响共享该文件的其他进程或语料的记录；
+这些记录随TTL过期和LRU淘汰（超过 max_entries）自然清除。使用增量构建的变更集
+（见 ingest_pdf.py）打开缓存时，上一版本中上下文文本块未被修改或删除的回答会
+复制到新版本。
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from search_index import normalize_query
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def answer_cache_key(question: str, language: str, model: str,
+                     prompt_version: str, chunk_ids: Iterable[str]) -> str:
+    """Cache key for one answer | 单个回答的缓存键"""
+    payload = json.dumps([
+        normalize_query(question),
+        language,
+        model,
+        prompt_version,
+        sorted(chunk_ids),
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """SQLite-backed LRU/TTL answer cache | 基于SQLite的LRU/TTL回答缓存
+
+    One connection guarded by a lock, so a single instance can be shared
+    by all sessions of a process.
+    单连接加锁，同一进程的所有会话可共享一个实例。
+    """
+
+    def __init__(self, db_path: str, corpus_version: str,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 change_set: Optional[Dict] = None):
+        self.db_path = db_path
+        self.corpus_version = corpus_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT NOT NULL,
+                    corpus_version TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    chunk_ids TEXT,
+                    PRIMARY KEY (key, corpus_version)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)"
+            )
+            if change_set and change_set.get('to_version') == corpus_version:
+                self._carry_over(change_set)
+
+    def _carry_over(self, change_set: Dict) -> None:
+        """Copy answers unaffected by a delta build to the new version | 将未受增量构建影响的回答复制到新版本
+
+        Rows are copied, not moved, so processes still serving the previous
+        version keep their answers. | 复制而非移动，仍在使用上一版本的进程不受影响。
+        """
+        changed = set(change_set.get('modified', ())) | set(change_set.get('removed', ()))
+        from_version = change_set.get('from_version')
+        rows = self._conn.execute(
+            "SELECT key, chunk_ids FROM answers WHERE corpus_version = ? AND chunk_ids IS NOT NULL",
+            (from_version,),
+        ).fetchall()
+        kept = [(self.corpus_version, key, from_version) for key, chunk_ids in rows
+                if changed.isdisjoint(json.loads(chunk_ids))]
+        self._conn.executemany("""
+            INSERT OR IGNORE INTO answers
+                (key, corpus_version, answer, created_at, last_access, chunk_ids)
+            SELECT key, ?, answer, created_at, last_access, chunk_ids
+            FROM answers WHERE key = ? AND corpus_version = ?
+        """, kept)
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached answer, or None on miss/expiry | 返回缓存回答，未命中或过期返回None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer, created_at FROM answers WHERE key = ? AND corpus_version = ?",
+                (key, self.corpus_version),
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE answers SET last_access = ? WHERE key = ? AND corpus_version = ?",
+                (now, key, self.corpus_version),
+            )
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, answer: str, chunk_ids: Iterable[str] = ()) -> None:
+        """Store an answer, then apply TTL and LRU eviction | 保存回答并执行TTL/LRU淘汰
+
+        ``chunk_ids`` are the context chunks the answer was built from; an
+        answer stored without them does not survive a delta build.
+        chunk_ids 为生成回答所用的上下文文本块；未提供时该回答不会在增量构建后保留。
+        """
+        now = time.time()
+        chunk_ids = list(chunk_ids)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(key, corpus_version, answer, created_at, last_access, chunk_ids) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.corpus_version, answer, now, now,
+                 json.dumps(sorted(chunk_ids)) if chunk_ids else None),
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._conn.execute("""
+                DELETE FROM answers WHERE rowid IN (
+                    SELECT rowid FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+def open_answer_cache(db_path: str, corpus_version: str, **kwargs) -> Optional[AnswerCache]:
+    """Open the cache, or None if the location is not writable | 打开缓存，无法写入时返回None"""
+    try:
+        return AnswerCache(db_path, corpus_version, **kwargs)
+    except sqlite3.Error:
+        return None
@@ -6,11 +6,22 @@ Australian Family Law AI Assistant - Bilingual Streamlit Web Interface
 """
 
 import streamlit as st
-import json
 import re
 import os
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from corpus_store import load_chunks
+from facets import FacetIndex, SearchFilter
+from query_expansion import expand_query
+from search_index import InvertedIndex
+from snippets import SnippetGenerator
+from spelling import SpellCorrector
+
+try:
+    from bm25 import BM25Index
+except ImportError:  # numpy/scipy not installed - keep the pure-Python index
+    BM25Index = None
 
 # Language detection and configuration
 # 语言检测和配置
@@ -27,6 +38,11 @@ LANGUAGES = {
         'example_questions': 'Example Questions',
         'results_title': 'Search Results',
         'no_results': 'No relevant results found. Try different keywords.',
+        'corrected_query': 'Did you mean',
+        'filters': '🗂️ Filters',
+        'filter_chapters': 'Chapters',
+        'filter_sections': 'Sections',
+        'filter_pages': 'Pages',
         'page_label': 'Page',
         'relevance_label': 'Relevance',
         'category_label': 'Category',
@@ -82,6 +98,11 @@ Always consult a qualified lawyer for specific legal matters.
         'example_questions': '示例问题',
         'results_title': '搜索结果',
         'no_results': '未找到相关结果。请尝试不同的关键词。',
+        'corrected_query': '您是否要查找',
+        'filters': '🗂️ 筛选',
+        'filter_chapters': '章节',
+        'filter_sections': '小节',
+        'filter_pages': '页码',
         'page_label': '页码',
         'relevance_label': '相关度',
         'category_label': '类别',
@@ -185,6 +206,11 @@ st.markdown("""
         margin: 1rem 0;
         font-weight: 400;
     }
+    .result-content mark {
+        background-color: #fff3b0;
+        color: inherit;
+        padding: 0 2px;
+    }
     .result-meta {
         display: flex;
         gap: 1rem;
@@ -217,65 +243,80 @@ st.markdown("""
 
 
 class FamilyLawSearchEngine:
-    """Family Law Search Engine | 家庭法搜索引擎"""
+    """Family Law Search Engine | 家庭法搜索引擎
+    
+    Read-only after construction, so one instance is shared by all sessions
+    and threads (see get_search_engine).
+    构建后只读，所有会话和线程共享同一实例（见 get_search_engine）。
+    """
     
     def __init__(self, chunks_path: str):
-        self.chunks = self._load_chunks(chunks_path)
-        self.search_history = []
-        
-    @st.cache_data
-    def _load_chunks(_self, path: str):
-        """Load knowledge base (cached) | 加载知识库（使用缓存）"""
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data['chunks']
+        self.chunks = load_chunks(chunks_path)
+        self.index = BM25Index(self.chunks) if BM25Index else InvertedIndex(self.chunks)
+        self.speller = SpellCorrector.from_chunks(self.chunks)
+        # Shares the index's token positions and offsets | 复用索引的词元位置和偏移
+        self.snippets = SnippetGenerator(self.chunks, self.index.positional)
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Execute search | 执行搜索"""
-        query_lower = query.lower()
-        query_terms = set(re.findall(r'\b\w+\b', query_lower))
-        
-        scored_chunks = []
-        for chunk in self.chunks:
-            text_lower = chunk['text'].lower()
-            score = 0
-            
-            # Exact phrase match
-            if query_lower in text_lower:
-                score += 10
-            
-            # Term matching
-            text_terms = set(re.findall(r'\b\w+\b', text_lower))
-            matching_terms = query_terms & text_terms
-            score += len(matching_terms) * 2
-            
-            # Boost by term frequency
-            for term in matching_terms:
-                score += text_lower.count(term)
-            
-            if score > 0:
-                scored_chunks.append({
-                    'chunk': chunk,
-                    'score': score
-                })
+    def correct(self, query: str) -> str:
+        """Query with misspelled words fixed | 纠正拼写错误后的查询"""
+        return self.speller.correct(query)
+    
+    def search(self, query: str, n_results: int = 5,
+               search_filter: Optional[SearchFilter] = None) -> List[Dict]:
+        """Execute search | 执行搜索
         
-        scored_chunks.sort(key=lambda x: x['score'], reverse=True)
-        return scored_chunks[:n_results]
+        Corrections of misspelled words are searched alongside the words
+        as typed, then Chinese terms are expanded to English ones, since the
+        corpus is English. ``search_filter`` limits the search to chapters,
+        sections or a page range. Each result carries a highlighted 'snippet'
+        of its best-matching passage.
+        先在原词之外加入拼写纠正结果一并检索，再将中文术语扩展为英文词（语料为英文）。
+        search_filter 将搜索限定在指定章、节或页码范围内。每个结果附带最匹配段落的
+        高亮摘要 'snippet'。
+        """
+        expanded = expand_query(self.speller.expand(query))
+        results = self.index.search(expanded, n_results=n_results, search_filter=search_filter)
+        return self.snippets.annotate(results, expanded)
+
+
+@st.cache_resource(show_spinner=False)
+def load_search_engine(chunks_path: str) -> FamilyLawSearchEngine:
+    """Process-wide search engine, built once | 进程级搜索引擎，只构建一次"""
+    return FamilyLawSearchEngine(chunks_path)
+
+
+def get_search_engine() -> FamilyLawSearchEngine:
+    """Shared search engine for the current session | 获取共享搜索引擎"""
+    # Use relative path for Streamlit Cloud compatibility
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    chunks_path = os.path.join(current_dir, 'family_law_chunks.json')
+    with st.spinner(LANGUAGES[st.session_state.language]['loading']):
+        return load_search_engine(chunks_path)
+
+
+def render_search_filters(facets: FacetIndex, lang_data: dict) -> Optional[SearchFilter]:
+    """Chapter / section / page-range filter controls | 章、节、页码范围过滤控件"""
+    with st.expander(lang_data['filters'], expanded=False):
+        chapters = st.multiselect(lang_data['filter_chapters'], sorted(facets.chapters),
+                                  key="filter_chapters")
+        sections = st.multiselect(lang_data['filter_sections'], sorted(facets.sections),
+                                  key="filter_sections")
+        page_range = None
+        if facets.pages:
+            first_page, last_page = facets.pages[0], facets.pages[-1]
+            pages = st.slider(lang_data['filter_pages'], first_page, last_page,
+                              (first_page, last_page), key="filter_pages")
+            if pages != (first_page, last_page):
+                page_range = pages
+    return SearchFilter(chapters, sections, page_range) or None
 
 
 def init_session_state():
-    """Initialize session state | 初始化session state"""
+    """Initialize per-user session state | 初始化用户会话状态"""
     if 'language' not in st.session_state:
         st.session_state.language = 'en'
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'search_engine' not in st.session_state:
-        with st.spinner(LANGUAGES[st.session_state.language]['loading']):
-            # Use relative path for Streamlit Cloud compatibility
-            import os
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            chunks_path = os.path.join(current_dir, 'family_law_chunks.json')
-            st.session_state.search_engine = FamilyLawSearchEngine(chunks_path)
     if 'search_count' not in st.session_state:
         st.session_state.search_count = 0
 
@@ -299,10 +340,11 @@ def display_result_card(result: Dict, index: int, lang_data: dict):
         with col1:
             st.markdown(f"### 📄 {lang_data['results_title']} #{index + 1}")
         with col2:
-            st.markdown(f"**{lang_data['relevance_label']}:** {score}")
+            st.markdown(f"**{lang_data['relevance_label']}:** {score:.2f}")
         
         # Content
-        st.markdown(f'<div class="result-content">{chunk["text"]}</div>', unsafe_allow_html=True)
+        # Best-matching passage with query terms highlighted | 最匹配段落，查询词高亮
+        st.markdown(f'<div class="result-content">{result["snippet"]}</div>', unsafe_allow_html=True)
         
         # Metadata
         meta_parts = []
@@ -320,6 +362,7 @@ def display_result_card(result: Dict, index: int, lang_data: dict):
 
 def main():
     init_session_state()
+    search_engine = get_search_engine()
     
     lang_data = LANGUAGES[st.session_state.language]
     
@@ -340,6 +383,11 @@ def main():
         
         st.markdown("---")
         
+        # Chapter / section / page filters | 章、节、页码过滤
+        search_filter = render_search_filters(search_engine.index.facets, lang_data)
+        
+        st.markdown("---")
+        
         # About section
         with st.expander(lang_data['about'], expanded=False):
             st.markdown(lang_data['about_text'])
@@ -414,7 +462,11 @@ def main():
         st.session_state.search_count += 1
         
         with st.spinner(lang_data['searching']):
-            results = st.session_state.search_engine.search(query, n_results=5)
+            results = search_engine.search(query, n_results=5, search_filter=search_filter)
+        
+        corrected = search_engine.correct(query)
+        if corrected != query:
+            st.info(f"{lang_data['corrected_query']}: **{corrected}**")
         
         if results:
             st.markdown(f"## {lang_data['results_title']}")
@@ -6,12 +6,29 @@ Australian Family Law AI Agent Pro - Bilingual with Claude API
 """
 
 import streamlit as st
-import json
 import re
 import os
+import html
 from datetime import datetime
-from typing import List, Dict, Optional
-import anthropic
+from typing import List, Dict, Optional, Iterator
+
+import timing
+from timing import span
+
+from answer_cache import answer_cache_key, open_answer_cache
+from context_packer import ContextPacker, DEFAULT_TOKEN_BUDGET
+from corpus_store import load_chunks, corpus_version, load_change_set
+from facets import FacetIndex, SearchFilter
+from lazy_imports import require
+from query_expansion import expand_query
+from search_index import InvertedIndex
+from snippets import SnippetGenerator
+from spelling import SpellCorrector
+
+try:
+    from bm25 import BM25Index
+except ImportError:  # numpy/scipy not installed - keep the pure-Python index
+    BM25Index = None
 
 # Language configurations
 LANGUAGES = {
@@ -25,6 +42,7 @@ LANGUAGES = {
         'thinking': '🤔 AI is thinking...',
         'searching': '🔍 Searching knowledge base...',
         'results_title': 'Relevant Content',
+        'corrected_query': 'Did you mean',
         'ai_answer_title': '💡 AI Answer',
         'no_api_key': '⚠️ No API key configured. Using search-only mode.',
         'about': 'About',
@@ -49,6 +67,12 @@ LANGUAGES = {
         'category_label': 'Category',
         'clear_chat': 'Clear Chat',
         'search_history': 'Chat History',
+        'timing': '⏱️ Latency breakdown',
+        'filters': '🗂️ Filters',
+        'filter_chapters': 'Chapters',
+        'filter_sections': 'Sections',
+        'filter_pages': 'Pages',
+        'timing_total': 'Total',
         'footer': 'Pro version with AI | Built with ❤️ for the legal community'
     },
     'zh': {
@@ -61,6 +85,7 @@ LANGUAGES = {
         'thinking': '🤔 AI正在思考...',
         'searching': '🔍 搜索知识库中...',
         'results_title': '相关内容',
+        'corrected_query': '您是否要查找',
         'ai_answer_title': '💡 AI回答',
         'no_api_key': '⚠️ 未配置API密钥。使用纯搜索模式。',
         'about': '关于',
@@ -85,6 +110,12 @@ LANGUAGES = {
         'category_label': '类别',
         'clear_chat': '清空对话',
         'search_history': '对话历史',
+        'timing': '⏱️ 延迟分解',
+        'filters': '🗂️ 筛选',
+        'filter_chapters': '章节',
+        'filter_sections': '小节',
+        'filter_pages': '页码',
+        'timing_total': '总计',
         'footer': 'AI专业版 | 为法律社区用❤️构建'
     }
 }
@@ -125,6 +156,11 @@ st.markdown("""
         margin-bottom: 0.5rem;
         color: #212121;
     }
+    .search-result mark {
+        background-color: #fff3b0;
+        color: inherit;
+        padding: 0 2px;
+    }
     .page-ref {
         background-color: #1976D2;
         color: white;
@@ -138,64 +174,104 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Claude model and prompt version (both part of the answer cache key;
+# bump PROMPT_VERSION whenever the prompts below change)
+# Claude模型和提示词版本（均为回答缓存键的一部分；修改提示词时请递增 PROMPT_VERSION）
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+PROMPT_VERSION = "pro-2"
+# Length of the search-result previews, in tokens (about 150 characters)
+# 搜索结果预览长度（词元数，约150字符）
+PREVIEW_TOKENS = 25
+
+
 class FamilyLawAIAgent:
-    """Family Law AI Agent Pro | 家庭法AI代理专业版"""
+    """Family Law AI Agent Pro | 家庭法AI代理专业版
+    
+    Holds the corpus, index and Claude client. Read-only after construction,
+    so one instance is shared by all sessions and threads (see get_agent).
+    包含语料、索引和Claude客户端；构建后只读，所有会话和线程共享（见 get_agent）。
+    """
     
-    def __init__(self, chunks_path: str, api_key: Optional[str] = None):
-        self.chunks = self._load_chunks(chunks_path)
+    def __init__(self, chunks_path: str, api_key: Optional[str] = None,
+                 vector_index_path: Optional[str] = None,
+                 answer_cache_path: Optional[str] = None,
+                 context_tokens: int = DEFAULT_TOKEN_BUDGET):
+        self.chunks = load_chunks(chunks_path)
+        # Overlap-free, token-budgeted prompt context | 去重叠、按token预算组装的上下文
+        self.context_packer = ContextPacker(token_budget=context_tokens)
+        self.index = BM25Index(self.chunks) if BM25Index else InvertedIndex(self.chunks)
+        self.speller = SpellCorrector.from_chunks(self.chunks)
+        self.snippets = SnippetGenerator(self.chunks, self.index.positional)
+        self.retriever = self.index
+        if vector_index_path:
+            self.retriever = self._load_hybrid_retriever(vector_index_path) or self.index
         self.claude_client = None
         if api_key:
             try:
+                # Imported only when a key is set | 仅在设置了密钥时导入
+                anthropic = require('anthropic', "Claude API")
                 self.claude_client = anthropic.Anthropic(api_key=api_key)
             except Exception as e:
                 st.error(f"Failed to initialize Claude API: {str(e)}")
+        # Shared answer cache, invalidated when the corpus file changes; only
+        # opened with a Claude client, so search-only starts create no file
+        # 共享回答缓存，语料文件变化时自动失效；仅在有Claude客户端时打开，
+        # 仅检索模式启动时不会创建数据库文件
+        self.answer_cache = None
+        if answer_cache_path and self.claude_client:
+            self.answer_cache = open_answer_cache(answer_cache_path, corpus_version(chunks_path),
+                                                  change_set=load_change_set(chunks_path))
     
-    @st.cache_data
-    def _load_chunks(_self, path: str):
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data['chunks']
-    
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Search relevant content | 搜索相关内容"""
-        query_lower = query.lower()
-        query_terms = set(re.findall(r'\b\w+\b', query_lower))
+    def _load_hybrid_retriever(self, vector_index_path: str):
+        """Keyword + vector retriever, or None if unavailable | 混合检索器，不可用时返回None
         
-        scored_chunks = []
-        for chunk in self.chunks:
-            text_lower = chunk['text'].lower()
-            score = 0
-            
-            # Exact phrase match
-            if query_lower in text_lower:
-                score += 10
-            
-            # Term matching
-            text_terms = set(re.findall(r'\b\w+\b', text_lower))
-            matching_terms = query_terms & text_terms
-            score += len(matching_terms) * 2
-            
-            # Boost by term frequency
-            for term in matching_terms:
-                score += text_lower.count(term)
-            
-            if score > 0:
-                scored_chunks.append({
-                    'chunk': chunk,
-                    'score': score
-                })
-        
-        scored_chunks.sort(key=lambda x: x['score'], reverse=True)
-        return scored_chunks[:n_results]
-    
-    def generate_ai_answer(self, query: str, context_chunks: List[Dict], language: str = 'en') -> str:
-        """Generate AI answer | 生成AI回答"""
-        if not self.claude_client:
+        The vector index is the .npz built by `family_law_agent_prototype.py --numpy`.
+        向量索引为 `family_law_agent_prototype.py --numpy` 生成的 .npz 文件。
+        """
+        if not os.path.exists(vector_index_path):
+            st.warning(f"Vector index not found, using keyword search: {vector_index_path}")
+            return None
+        try:
+            sentence_transformers = require('sentence_transformers', "Hybrid search")
+            from embedding_store import QueryEncoder, EMBEDDING_MODEL
+            from vector_index import NumpyVectorIndex
+            from hybrid_search import HybridRetriever, vector_ranking
+        except ImportError as e:
+            st.warning(f"Hybrid search unavailable, using keyword search: {str(e)}")
             return None
         
+        query_encoder = QueryEncoder(sentence_transformers.SentenceTransformer(EMBEDDING_MODEL))
+        collection = NumpyVectorIndex.load(vector_index_path)
+        return HybridRetriever(self.chunks, self.index, vector_ranking(collection, query_encoder))
+    
+    def correct(self, query: str) -> str:
+        """Query with misspelled words fixed, for "did you mean" | 纠正拼写错误后的查询（用于提示）"""
+        return self.speller.correct(query)
+    
+    def search(self, query: str, n_results: int = 5,
+               search_filter: Optional[SearchFilter] = None) -> List[Dict]:
+        """Search relevant content, optionally within chapters, sections or pages
+        搜索相关内容，可限定章、节或页码范围
+        """
+        # Spelling corrections added next to the words as typed, Chinese
+        # terms → English corpus terms
+        # 在原词旁加入拼写纠正结果，中文术语扩展为英文词
+        with span('expand_query'):
+            expanded = expand_query(self.speller.expand(query))
+        with span('retrieve'):
+            results = self.retriever.search(expanded, n_results=n_results,
+                                            search_filter=search_filter)
+        # Short highlighted preview of the best-matching passage | 最匹配段落的简短高亮预览
+        with span('snippets'):
+            return self.snippets.annotate(results, expanded, max_tokens=PREVIEW_TOKENS)
+    
+    def _build_request(self, query: str, context_chunks: List[Dict], language: str) -> Dict:
+        """Claude request for a question and its context | 构建Claude请求"""
+        passages = self.context_packer.pack(expand_query(self.speller.expand(query)),
+                                            [result['chunk'] for result in context_chunks[:5]])
         context_text = "\n\n".join([
-            f"[Page {result['chunk'].get('page', 'N/A')}] {result['chunk'].get('text', '')}"
-            for result in context_chunks[:5]
+            f"[Page {passage['page']}] {passage['text']}"
+            for passage in passages
         ])
         
         if language == 'zh':
@@ -237,19 +313,102 @@ Question: {query}
 
 Provide a clear, professional answer with page citations."""
         
+        return dict(
+            model=CLAUDE_MODEL,
+            max_tokens=1000,
+            system=system_prompt,
+            messages=[{
+                "role": "user",
+                "content": user_prompt
+            }]
+        )
+    
+    @staticmethod
+    def _context_ids(context_chunks: List[Dict]) -> List[str]:
+        """chunk_ids an answer is built from | 生成回答所用的 chunk_id"""
+        return [result['chunk']['chunk_id'] for result in context_chunks[:5]]
+    
+    def _cache_key(self, query: str, context_chunks: List[Dict], language: str) -> Optional[str]:
+        """Answer cache key, or None when caching is off | 回答缓存键"""
+        if self.answer_cache is None:
+            return None
+        chunk_ids = self._context_ids(context_chunks)
+        # The token budget changes the context, so it is part of the prompt version
+        prompt_version = f"{PROMPT_VERSION}/{self.context_packer.token_budget}"
+        return answer_cache_key(query, language, CLAUDE_MODEL, prompt_version, chunk_ids)
+    
+    def generate_ai_answer(self, query: str, context_chunks: List[Dict], language: str = 'en') -> str:
+        """Generate AI answer | 生成AI回答"""
+        if not self.claude_client:
+            return None
+        
+        cache_key = self._cache_key(query, context_chunks, language)
+        if cache_key:
+            with span('cache_lookup'):
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        with span('build_prompt'):
+            request = self._build_request(query, context_chunks, language)
         try:
-            response = self.claude_client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1000,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }]
-            )
-            return response.content[0].text
+            with span('claude_call'):
+                response = self.claude_client.messages.create(**request)
+            answer = response.content[0].text
         except Exception as e:
             return f"Error generating AI response: {str(e)}"
+        
+        if cache_key:
+            with span('cache_store'):
+                self.answer_cache.put(cache_key, answer, self._context_ids(context_chunks))
+        return answer
+    
+    def stream_ai_answer(self, query: str, context_chunks: List[Dict], language: str = 'en') -> Iterator[str]:
+        """Generate AI answer as text deltas | 流式生成AI回答
+        
+        Yields text as Claude produces it, so the first words can be shown
+        long before the full answer is done. Errors are yielded as text.
+        边生成边返回文本片段；出错时以文本形式返回错误信息。
+        """
+        if not self.claude_client:
+            return
+        
+        # Cache hit: the whole answer at once, no API call
+        # 缓存命中：直接返回完整回答，不调用API
+        cache_key = self._cache_key(query, context_chunks, language)
+        if cache_key:
+            with span('cache_lookup'):
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        with span('build_prompt'):
+            request = self._build_request(query, context_chunks, language)
+        parts = []
+        try:
+            # claude_call includes rendering the streamed text; claude_first_token
+            # is the wait the user actually sees
+            # claude_call 包含流式渲染时间；claude_first_token 为用户实际等待的时间
+            with span('claude_call'), self.claude_client.messages.stream(**request) as stream:
+                texts = iter(stream.text_stream)
+                with span('claude_first_token'):
+                    first = next(texts, None)
+                if first is not None:
+                    parts.append(first)
+                    yield first
+                for text in texts:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            yield f"\n\nError generating AI response: {str(e)}"
+            return
+        
+        # Only complete, successful answers are cached
+        # 只缓存完整且成功的回答
+        if cache_key and parts:
+            with span('cache_store'):
+                self.answer_cache.put(cache_key, "".join(parts), self._context_ids(context_chunks))
 
 
 def detect_language(text: str) -> str:
@@ -258,25 +417,109 @@ def detect_language(text: str) -> str:
     return 'zh' if len(chinese_chars) > len(text) * 0.3 else 'en'
 
 
+@st.cache_resource(show_spinner=False)
+def load_agent(chunks_path: str, api_key: Optional[str],
+               vector_index_path: Optional[str] = None,
+               answer_cache_path: Optional[str] = None,
+               context_tokens: int = DEFAULT_TOKEN_BUDGET) -> FamilyLawAIAgent:
+    """Process-wide AI agent, built once | 进程级AI代理，只构建一次"""
+    with timing.trace('load_agent'):
+        return FamilyLawAIAgent(chunks_path, api_key=api_key, vector_index_path=vector_index_path,
+                                answer_cache_path=answer_cache_path, context_tokens=context_tokens)
+
+
+def get_agent() -> FamilyLawAIAgent:
+    """Shared AI agent for the current session | 获取共享AI代理"""
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    # Optional hybrid search: path to a NumPy vector index (.npz)
+    # 可选混合检索：NumPy向量索引(.npz)路径
+    vector_index_path = os.environ.get('FAMILY_LAW_VECTOR_INDEX')
+    # Use relative path for Streamlit Cloud
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    chunks_path = os.path.join(current_dir, 'family_law_chunks.json')
+    # Answer cache shared with family_law_agent_prototype.py (SQLite)
+    # 与 family_law_agent_prototype.py 共用的回答缓存（SQLite）
+    answer_cache_path = os.environ.get('FAMILY_LAW_ANSWER_CACHE',
+                                       os.path.join(current_dir, 'answer_cache.sqlite3'))
+    # Token budget for the context sent to Claude | 发送给Claude的上下文token预算
+    context_tokens = int(os.environ.get('FAMILY_LAW_CONTEXT_TOKENS', DEFAULT_TOKEN_BUDGET))
+    with st.spinner(LANGUAGES[st.session_state.language]['loading']):
+        return load_agent(chunks_path, api_key, vector_index_path, answer_cache_path,
+                          context_tokens)
+
+
+def render_search_filters(facets: FacetIndex, lang_data: dict) -> Optional[SearchFilter]:
+    """Chapter / section / page-range filter controls | 章、节、页码范围过滤控件"""
+    with st.expander(lang_data['filters'], expanded=False):
+        chapters = st.multiselect(lang_data['filter_chapters'], sorted(facets.chapters),
+                                  key="filter_chapters")
+        sections = st.multiselect(lang_data['filter_sections'], sorted(facets.sections),
+                                  key="filter_sections")
+        page_range = None
+        if facets.pages:
+            first_page, last_page = facets.pages[0], facets.pages[-1]
+            pages = st.slider(lang_data['filter_pages'], first_page, last_page,
+                              (first_page, last_page), key="filter_pages")
+            if pages != (first_page, last_page):
+                page_range = pages
+    return SearchFilter(chapters, sections, page_range) or None
+
+
 def init_session_state():
-    """Initialize session state | 初始化状态"""
+    """Initialize per-user session state | 初始化用户会话状态"""
     if 'language' not in st.session_state:
         st.session_state.language = 'en'
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'agent' not in st.session_state:
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-        with st.spinner(LANGUAGES[st.session_state.language]['loading']):
-            # Use relative path for Streamlit Cloud
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            chunks_path = os.path.join(current_dir, 'family_law_chunks.json')
-            st.session_state.agent = FamilyLawAIAgent(chunks_path, api_key=api_key)
     if 'use_ai' not in st.session_state:
-        st.session_state.use_ai = st.session_state.agent.claude_client is not None
+        st.session_state.use_ai = get_agent().claude_client is not None
+
+
+def render_message(message: Dict, container=None):
+    """Render one chat message bubble | 渲染一条聊天消息"""
+    css_class, icon = {
+        "user": ("user-message", "👤"),
+        "assistant": ("ai-message", "🤖"),
+        "search": ("search-result", "🔍"),
+    }[message["role"]]
+    (container or st).markdown(
+        f'<div class="chat-message {css_class}">{icon} {message["content"]}</div>',
+        unsafe_allow_html=True
+    )
+
+
+def stream_answer_into_bubble(chunks: Iterator[str], thinking_label: str) -> str:
+    """Render streamed text into a live chat bubble | 将流式文本渲染到聊天气泡
+    
+    The spinner only covers the wait for the first token.
+    加载动画只覆盖等待首个token的时间。
+    """
+    placeholder = st.empty()
+    with st.spinner(thinking_label):
+        first = next(chunks, None)
+    if first is None:
+        return ""
+    
+    answer = first
+    render_message({"role": "assistant", "content": answer}, placeholder)
+    for text in chunks:
+        answer += text
+        render_message({"role": "assistant", "content": answer}, placeholder)
+    return answer
+
+
+def render_timing(record: Dict, lang_data: Dict):
+    """Latency breakdown of the last request | 上一个请求的延迟分解"""
+    lines = [f"**{lang_data['timing_total']}: {record['total_ms']:.0f} ms**"]
+    for entry in record['spans']:
+        indent = "&nbsp;" * 4 * entry['depth']
+        lines.append(f"{indent}`{entry['name']}` {entry['duration_ms']:.1f} ms")
+    st.markdown("  \n".join(lines), unsafe_allow_html=True)
 
 
 def main():
     init_session_state()
+    agent = get_agent()
     
     lang_data = LANGUAGES[st.session_state.language]
     
@@ -299,7 +542,7 @@ def main():
         st.markdown("---")
         
         # Mode toggle
-        if st.session_state.agent.claude_client:
+        if agent.claude_client:
             st.markdown(f"### {lang_data['toggle_mode']}")
             use_ai = st.toggle(
                 lang_data['ai_mode'] if st.session_state.use_ai else lang_data['search_mode'],
@@ -312,6 +555,19 @@ def main():
         
         st.markdown("---")
         
+        # Chapter / section / page filters | 章、节、页码过滤
+        search_filter = render_search_filters(agent.index.facets, lang_data)
+        
+        st.markdown("---")
+        
+        # Per-request latency breakdown (always on with FAMILY_LAW_TIMING=1)
+        # 每个请求的延迟分解（设置 FAMILY_LAW_TIMING=1 时始终开启）
+        show_timing = st.checkbox(lang_data['timing'], value=timing.ENABLED, key="show_timing")
+        if show_timing and st.session_state.get('last_timing'):
+            render_timing(st.session_state.last_timing, lang_data)
+        
+        st.markdown("---")
+        
         # About
         with st.expander(lang_data['about'], expanded=False):
             st.markdown(lang_data['about_text'])
@@ -330,15 +586,7 @@ def main():
     
     # Chat interface
     for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f'<div class="chat-message user-message">👤 {message["content"]}</div>',
-                       unsafe_allow_html=True)
-        elif message["role"] == "assistant":
-            st.markdown(f'<div class="chat-message ai-message">🤖 {message["content"]}</div>',
-                       unsafe_allow_html=True)
-        elif message["role"] == "search":
-            st.markdown(f'<div class="chat-message search-result">🔍 {message["content"]}</div>',
-                       unsafe_allow_html=True)
+        render_message(message)
     
     # Input
     col1, col2 = st.columns([5, 1])
@@ -361,40 +609,55 @@ def main():
             lang_data = LANGUAGES[detected_lang]
         
         # Add user message
-        st.session_state.messages.append({
+        user_message = {
             "role": "user",
             "content": query
-        })
+        }
+        st.session_state.messages.append(user_message)
+        render_message(user_message)
         
-        # Search
-        with st.spinner(lang_data['searching']):
-            results = st.session_state.agent.search(query, n_results=5)
-        
-        # Display search results
-        if results:
-            search_summary = f"{lang_data['results_title']}:\n"
-            for idx, result in enumerate(results[:3]):
-                chunk = result['chunk']
-                page = chunk.get('page', 'N/A')
-                text_preview = chunk['text'][:150] + "..."
-                search_summary += f"\n📄 {lang_data['page_label']} {page}: {text_preview}"
+        with timing.trace('ask', enabled=timing.ENABLED or show_timing,
+                          app='pro', language=st.session_state.language) as request_trace:
+            # Search
+            with st.spinner(lang_data['searching']):
+                results = agent.search(query, n_results=5, search_filter=search_filter)
             
-            st.session_state.messages.append({
-                "role": "search",
-                "content": search_summary
-            })
-        
-        # Generate AI answer if enabled
-        if st.session_state.use_ai and results:
-            with st.spinner(lang_data['thinking']):
-                ai_answer = st.session_state.agent.generate_ai_answer(
-                    query, results, st.session_state.language
+            # Display search results, after a "did you mean" notice if a
+            # word was corrected (kept in the history, so it survives the rerun)
+            # 显示搜索结果；有拼写纠正时先显示提示（保存在历史中，重新运行后仍在）
+            corrected = agent.correct(query)
+            search_summary = ""
+            if corrected != query:
+                search_summary = f"{lang_data['corrected_query']}: <b>{html.escape(corrected)}</b>\n\n"
+            if results:
+                search_summary += f"{lang_data['results_title']}:\n"
+                for idx, result in enumerate(results[:3]):
+                    chunk = result['chunk']
+                    page = chunk.get('page', 'N/A')
+                    search_summary += f"\n📄 {lang_data['page_label']} {page}: {result['snippet']}"
+            
+            if search_summary:
+                search_message = {
+                    "role": "search",
+                    "content": search_summary
+                }
+                st.session_state.messages.append(search_message)
+                render_message(search_message)
+            
+            # Generate AI answer if enabled, streaming tokens into the chat bubble
+            if st.session_state.use_ai and results:
+                ai_answer = stream_answer_into_bubble(
+                    agent.stream_ai_answer(query, results, st.session_state.language),
+                    lang_data['thinking']
                 )
+                # Save to history only once the answer is complete
                 if ai_answer:
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": ai_answer
                     })
+        # Shown in the sidebar after the rerun | 重新运行后在侧边栏显示
+        st.session_state.last_timing = request_trace.to_dict() if request_trace else None
         
         st.rerun()
     
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量问答 - 异步并发生成整套FAQ的回答
+Batch question answering with bounded concurrency
+
+输入为JSONL文件，每行一个JSON对象，至少包含 "question" 字段（其余字段原样保留，
+例如 "id"）。检索在线程池中执行，Claude调用通过 AsyncAnthropic 并发发出，
+同时进行的请求数由 --concurrency 限制。输出JSONL与输入顺序一致，每行增加
+answer、citations（chunk_id / 页码 / 章节）、cached 和 error 字段。
+与 family_law_agent_prototype.py 共用同一回答缓存，未变化的问题不会重复调用API。
+
+用法:
+    python3 batch_qa.py questions.jsonl answers.jsonl --concurrency 8
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import anthropic
+
+from context_packer import DEFAULT_TOKEN_BUDGET
+from family_law_agent_prototype import FamilyLawAgent
+
+
+def read_questions(path: str) -> List[Dict]:
+    """读取问题JSONL（跳过空行）"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict) or not record.get('question'):
+                raise ValueError(f"{path}:{line_no}: 每行必须是包含 question 字段的JSON对象")
+            records.append(record)
+    return records
+
+
+def citations(search_results: List[Dict]) -> List[Dict]:
+    """检索结果 -> 引用列表（chunk_id、页码、章节）"""
+    return [{
+        'chunk_id': r['chunk_id'],
+        'page': r['metadata']['page'],
+        'chapter': r['metadata']['chapter'],
+    } for r in search_results]
+
+
+async def answer_one(agent: FamilyLawAgent, client: anthropic.AsyncAnthropic,
+                     semaphore: asyncio.Semaphore, retrieval_pool: ThreadPoolExecutor,
+                     record: Dict, n_results: int) -> Dict:
+    """检索并回答单个问题；失败时记录错误，不抛出"""
+    question = record['question']
+    output = dict(record, answer=None, citations=[], cached=False, error=None)
+    try:
+        loop = asyncio.get_running_loop()
+        search_results = await loop.run_in_executor(retrieval_pool, agent.search, question, n_results)
+        output['citations'] = citations(search_results)
+
+        cache_key = None
+        if agent.answer_cache is not None:
+            cache_key = agent.answer_cache_key(question, search_results)
+            cached = agent.answer_cache.get(cache_key)
+            if cached is not None:
+                output['answer'] = cached
+                output['cached'] = True
+                return output
+
+        request = agent.build_request(question, agent.build_context(question, search_results))
+        async with semaphore:
+            message = await client.messages.create(**request)
+        output['answer'] = message.content[0].text
+
+        if cache_key:
+            agent.answer_cache.put(cache_key, output['answer'],
+                                   [r['chunk_id'] for r in search_results])
+    except Exception as e:
+        output['error'] = f"{type(e).__name__}: {e}"
+    return output
+
+
+async def run_batch(agent: FamilyLawAgent, client: anthropic.AsyncAnthropic,
+                    records: List[Dict], out_path: str, concurrency: int = 8,
+                    retrieval_workers: int = 4, n_results: int = 5) -> Dict:
+    """并发回答所有问题，按输入顺序逐行写出结果，返回统计信息"""
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {'total': len(records), 'answered': 0, 'cached': 0, 'failed': 0}
+
+    with ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix='batch-retrieval') as pool:
+        tasks = [
+            asyncio.create_task(answer_one(agent, client, semaphore, pool, record, n_results))
+            for record in records
+        ]
+        # 所有任务已并发运行；按输入顺序等待，已完成的结果立即写出
+        with open(out_path, 'w', encoding='utf-8') as f:
+            for done, task in enumerate(tasks, 1):
+                output = await task
+                f.write(json.dumps(output, ensure_ascii=False) + '\n')
+                f.flush()
+                if output['error']:
+                    stats['failed'] += 1
+                    print(f"  ❌ [{done}/{len(records)}] {output['question'][:60]} - {output['error']}")
+                else:
+                    stats['answered'] += 1
+                    stats['cached'] += output['cached']
+                    print(f"  ✓ [{done}/{len(records)}] {output['question'][:60]}"
+                          f"{' (缓存)' if output['cached'] else ''}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量问答：从JSONL读取问题，并发生成回答")
+    parser.add_argument('questions', help="输入JSONL，每行包含 question 字段")
+    parser.add_argument('output', help="输出JSONL（与输入顺序一致）")
+    parser.add_argument('--concurrency', type=int, default=8, help="同时进行的Claude请求数 (默认 8)")
+    parser.add_argument('--retrieval-workers', type=int, default=4, help="检索线程数 (默认 4)")
+    parser.add_argument('--n-results', type=int, default=5, help="每个问题检索的段落数 (默认 5)")
+    parser.add_argument('--context-tokens', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"每个问题的上下文token预算 (默认 {DEFAULT_TOKEN_BUDGET})")
+    parser.add_argument('--chunks', default='family_law_chunks.json', help="知识库JSON路径")
+    parser.add_argument('--db', default='./family_law_db', help="向量数据库目录")
+    parser.add_argument('--numpy', action='store_true', help="使用NumPy向量索引代替Chroma")
+    args = parser.parse_args()
+
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not api_key:
+        print("❌ 批量问答需要设置环境变量 ANTHROPIC_API_KEY")
+        return 1
+
+    records = read_questions(args.questions)
+    print(f"📋 读取 {len(records)} 个问题")
+
+    agent = FamilyLawAgent(
+        chunks_path=args.chunks,
+        db_path=args.db,
+        vector_backend="numpy" if args.numpy else "chroma",
+        context_tokens=args.context_tokens
+    )
+    agent.setup()
+    # SDK自带限流/过载重试
+    client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=5)
+
+    print(f"\n🚀 开始批量问答 (并发 {args.concurrency}, 检索线程 {args.retrieval_workers})...")
+    start = time.perf_counter()
+    stats = asyncio.run(run_batch(
+        agent, client, records, args.output,
+        concurrency=args.concurrency,
+        retrieval_workers=args.retrieval_workers,
+        n_results=args.n_results,
+    ))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n✅ 完成: {stats['answered']}/{stats['total']} 个回答 "
+          f"(缓存 {stats['cached']}, 失败 {stats['failed']}), 用时 {elapsed:.1f} 秒")
+    print(f"   结果已写入 {args.output}")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retrieval micro-benchmarks for every search backend
+所有检索后端的微基准测试
+
+Backends | 后端:
+    inverted      InvertedIndex (app.py engine without numpy/scipy)
+    bm25          BM25Index (app.py engine)
+    demo          SimpleLegalSearch.simple_search (demo_search.py full scan)
+    numpy-vector  NumpyVectorIndex + query encoding (needs sentence-transformers)
+    chroma        Chroma collection + query encoding, as in
+                  family_law_agent_prototype.py (needs chromadb)
+    hybrid        BM25 + NumpyVectorIndex fused with RRF, as in app_pro.py
+
+Each (corpus, backend) pair runs in a fresh spawned process so peak RSS is
+its own. Synthetic corpora replicate family_law_chunks.json N times with new
+chunk_ids. Embeddings are cached by text hash, so replicas are encoded only
+once. Results are written as JSON for comparison between releases.
+每个（语料, 后端）组合在独立的新进程中运行，峰值内存互不影响。合成语料将
+family_law_chunks.json 复制N倍并重新编号；嵌入按文本哈希缓存，副本只编码一次。
+结果以JSON保存，便于比较不同版本。
+
+Usage | 用法:
+    python3 benchmark_search.py --scales 1,10,100 --output benchmark_results.json
+    python3 benchmark_search.py --backends bm25,inverted --repeat 20
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import argparse
+import resource
+import subprocess
+import contextlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from corpus_store import load_chunks
+
+BACKENDS = ['inverted', 'bm25', 'demo', 'numpy-vector', 'chroma', 'hybrid']
+
+# The example questions shown in app.py, English and Chinese
+# app.py 中的示例问题（英文和中文）
+BENCHMARK_QUERIES = [
+    "What are the requirements for divorce?",
+    "How is property divided in separation?",
+    "What factors affect child custody decisions?",
+    "How is child support calculated?",
+    "What is a de facto relationship?",
+    "What are parenting orders?",
+    "How does spousal maintenance work?",
+    "What is the Family Court process?",
+    "What are consent orders?",
+    "What happens to superannuation in divorce?",
+    "What is a binding financial agreement?",
+    "How long does divorce take?",
+    "What is shared parental responsibility?",
+    "离婚需要什么条件？",
+    "子女抚养费如何计算？",
+    "什么是同意令？",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a sorted list | 已排序列表的最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(sorted_ms: List[float]) -> Dict:
+    """p50/p95/p99/mean of sorted latencies in ms | 已排序延迟（毫秒）的统计"""
+    return {
+        'p50': round(percentile(sorted_ms, 50), 3),
+        'p95': round(percentile(sorted_ms, 95), 3),
+        'p99': round(percentile(sorted_ms, 99), 3),
+        'mean': round(sum(sorted_ms) / len(sorted_ms), 3) if sorted_ms else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process | 当前进程的峰值内存"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS | Linux单位为KiB，macOS为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def make_corpus(source_path: str, scale: int, work_dir: str) -> str:
+    """Write a corpus replicated ``scale`` times, reusing an existing file | 生成复制N倍的合成语料"""
+    if scale == 1:
+        return source_path
+    path = os.path.join(work_dir, f'family_law_chunks_x{scale}.json')
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        return path
+
+    with open(source_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    chunks = data['chunks']
+    replicated = []
+    for copy in range(scale):
+        for chunk in chunks:
+            replica = dict(chunk)
+            replica['chunk_id'] = f"chunk_{len(replicated) + 1:07d}"
+            replicated.append(replica)
+    metadata = dict(data.get('metadata', {}))
+    metadata['synthetic_scale'] = scale
+    metadata['statistics'] = dict(metadata.get('statistics', {}), total_chunks=len(replicated))
+
+    os.makedirs(work_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': metadata, 'chunks': replicated}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _vector_collection(backend: str, chunks, work_dir: str, timings: Dict):
+    """Embed the corpus into a vector store; returns (collection, encoder) | 构建向量库"""
+    from sentence_transformers import SentenceTransformer
+    from embedding_store import EmbeddingStore, QueryEncoder, EMBEDDING_MODEL
+
+    start = time.perf_counter()
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    timings['model_load_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = EmbeddingStore(os.path.join(work_dir, 'embedding_cache'), EMBEDDING_MODEL)
+    embeddings = store.encode(model, [chunk['text'] for chunk in chunks])
+    timings['embed_s'] = time.perf_counter() - start
+
+    ids = [chunk['chunk_id'] for chunk in chunks]
+    documents = [chunk['text'] for chunk in chunks]
+    metadatas = [{'page': chunk['page']} for chunk in chunks]
+
+    start = time.perf_counter()
+    if backend == 'chroma':
+        import chromadb
+        db_path = os.path.join(work_dir, f'chroma_{len(chunks)}')
+        shutil.rmtree(db_path, ignore_errors=True)
+        client = chromadb.PersistentClient(path=db_path)
+        collection = client.create_collection(name='benchmark')
+        for i in range(0, len(ids), 1000):
+            collection.add(ids=ids[i:i + 1000], embeddings=embeddings[i:i + 1000].tolist(),
+                           documents=documents[i:i + 1000], metadatas=metadatas[i:i + 1000])
+    else:
+        from vector_index import NumpyVectorIndex
+        collection = NumpyVectorIndex()
+        collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    timings['build_s'] = time.perf_counter() - start
+
+    # No query cache: every timed query pays for its own encoding
+    # 不使用查询缓存：每次计时的查询都包含编码开销
+    return collection, QueryEncoder(model, max_size=0)
+
+
+def build_backend(backend: str, corpus_path: str, work_dir: str, timings: Dict,
+                  expand: bool = True) -> Tuple[int, Callable[[str, int], List[str]]]:
+    """Load and index a corpus for one backend | 为一个后端加载语料并建立索引
+
+    Returns (number of chunks, search) where search(query, k) gives the
+    ranked chunk_ids. Load and build times are recorded in ``timings``.
+    ``expand`` toggles zh→en query expansion (demo_search always expands).
+    返回（文本块数, search），search(query, k) 返回排序后的chunk_id；
+    加载和构建时间写入 timings。expand 控制中文查询扩展（demo_search 始终扩展）。
+    """
+    from query_expansion import expand_query
+    prepare = expand_query if expand else (lambda query: query)
+
+    if backend == 'demo':
+        from demo_search import SimpleLegalSearch
+        start = time.perf_counter()
+        engine = SimpleLegalSearch(corpus_path)
+        timings['load_s'] = time.perf_counter() - start
+        timings['build_s'] = 0.0
+        return len(engine.chunks), lambda query, k: [
+            result['chunk']['chunk_id'] for result in engine.simple_search(query, n=k)
+        ]
+
+    start = time.perf_counter()
+    chunks = load_chunks(corpus_path)
+    timings['load_s'] = time.perf_counter() - start
+
+    if backend in ('inverted', 'bm25'):
+        if backend == 'bm25':
+            from bm25 import BM25Index as Index
+        else:
+            from search_index import InvertedIndex as Index
+        start = time.perf_counter()
+        index = Index(chunks)
+        timings['build_s'] = time.perf_counter() - start
+        return len(chunks), lambda query, k: [
+            result['chunk']['chunk_id'] for result in index.search(prepare(query), n_results=k)
+        ]
+
+    if backend == 'hybrid':
+        from bm25 import BM25Index
+        from hybrid_search import HybridRetriever, vector_ranking
+        collection, encoder = _vector_collection(backend, chunks, work_dir, timings)
+        start = time.perf_counter()
+        retriever = HybridRetriever(chunks, BM25Index(chunks), vector_ranking(collection, encoder))
+        timings['build_s'] += time.perf_counter() - start
+        return len(chunks), lambda query, k: [
+            result['chunk']['chunk_id'] for result in retriever.search(prepare(query), n_results=k)
+        ]
+
+    collection, encoder = _vector_collection(backend, chunks, work_dir, timings)
+    return len(chunks), lambda query, k: collection.query(
+        query_embeddings=[encoder.encode(prepare(query)).tolist()], n_results=k
+    )['ids'][0]
+
+
+def run_backend(backend: str, corpus_path: str, work_dir: str, queries: List[str],
+                repeat: int, time_budget: float) -> Dict:
+    """Benchmark one backend on one corpus (runs in a child process) | 在子进程中测试一个后端"""
+    result = {'backend': backend}
+    timings = {}
+    baseline_rss = peak_rss_mb()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            n_chunks, search = build_backend(backend, corpus_path, work_dir, timings)
+
+            # Warm-up pass, not timed | 预热一轮，不计时
+            for query in queries:
+                search(query, 5)
+
+            latencies = []
+            deadline = time.perf_counter() + time_budget
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for query in queries:
+                    t0 = time.perf_counter()
+                    search(query, 5)
+                    latencies.append(time.perf_counter() - t0)
+                if time.perf_counter() > deadline:
+                    break
+            total = time.perf_counter() - start
+    except ImportError as e:
+        result['skipped'] = f"missing dependency: {e.name or e}"
+        return result
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    result.update({
+        'n_chunks': n_chunks,
+        **{key: round(value, 4) for key, value in timings.items()},
+        'n_queries': len(latencies_ms),
+        'latency_ms': latency_summary(latencies_ms),
+        'qps': round(len(latencies_ms) / total, 1) if total > 0 else None,
+        'baseline_rss_mb': round(baseline_rss, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    })
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索后端微基准测试")
+    parser.add_argument('--chunks', default='family_law_chunks.json', help="知识库JSON路径")
+    parser.add_argument('--scales', default='1,10,100', help="语料倍数，逗号分隔 (默认 1,10,100)")
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help=f"要测试的后端，逗号分隔 (默认全部: {','.join(BACKENDS)})")
+    parser.add_argument('--repeat', type=int, default=10, help="每个查询的重复次数 (默认 10)")
+    parser.add_argument('--time-budget', type=float, default=30.0,
+                        help="每个后端的计时上限（秒），超过后停止重复 (默认 30)")
+    parser.add_argument('--work-dir', default='./benchmark_data', help="合成语料和嵌入缓存目录")
+    parser.add_argument('--output', default='benchmark_results.json', help="结果JSON路径")
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale.strip()]
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"未知后端: {', '.join(sorted(unknown))}")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'queries': BENCHMARK_QUERIES,
+        'repeat': args.repeat,
+        'corpora': [],
+        'results': [],
+    }
+
+    spawn = multiprocessing.get_context('spawn')
+    for scale in scales:
+        print(f"\n📚 语料 ×{scale}")
+        corpus_path = make_corpus(args.chunks, scale, args.work_dir)
+        # Build the memory-mapped corpus here so every backend loads it warm
+        # 在此构建内存映射语料，所有后端的加载时间均为热加载
+        start = time.perf_counter()
+        n_chunks = len(load_chunks(corpus_path))
+        report['corpora'].append({'scale': scale, 'path': corpus_path, 'n_chunks': n_chunks,
+                                  'prepare_s': round(time.perf_counter() - start, 4)})
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                result = pool.submit(run_backend, backend, corpus_path, args.work_dir,
+                                     BENCHMARK_QUERIES, args.repeat, args.time_budget).result()
+            result['scale'] = scale
+            report['results'].append(result)
+            if 'skipped' in result:
+                print(f"  ⏭️  {backend:<13} 跳过 ({result['skipped']})")
+            else:
+                latency = result['latency_ms']
+                print(f"  ✓ {backend:<13} 加载 {result['load_s']:.2f}s  构建 {result['build_s']:.2f}s  "
+                      f"p50 {latency['p50']:.2f}ms  p95 {latency['p95']:.2f}ms  p99 {latency['p99']:.2f}ms  "
+                      f"{result['qps']} QPS  峰值内存 {result['peak_rss_mb']:.0f}MB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token-budgeted context assembly for Claude prompts
+按token预算组装Claude提示词上下文
+
+Retrieved chunks were cut with a 50-word overlap (metadata.chunking_config),
+so neighbouring hits repeat text. The packer merges runs of consecutive
+chunk_ids, strips the overlapping words, splits the result into sentences,
+ranks them by query relevance and keeps the best ones that fit the token
+budget. Kept sentences are emitted in book order, grouped by page, so every
+passage still carries its page citation.
+检索到的文本块按50词重叠切分，相邻命中会重复内容。打包器合并连续的chunk_id，
+去除重叠词，切分句子并按查询相关度排序，在token预算内保留最相关的句子。
+保留的句子按原书顺序按页分组输出，每段仍带有页码引用。
+"""
+
+import re
+import math
+from typing import Dict, List, Optional, Sequence
+
+from search_index import tokenize
+
+DEFAULT_TOKEN_BUDGET = 1200
+DEFAULT_OVERLAP_WORDS = 50
+
+# Sentences longer than this are split into windows (tables of contents and
+# form lists in the book have no sentence punctuation)
+# 超过此长度的句子按窗口切分（目录和表格列表没有句末标点）
+MAX_SENTENCE_WORDS = 60
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:])\s+(?=[A-Z0-9("\'\[])')
+_CHUNK_NUMBER = re.compile(r'(\d+)$')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token | 粗略估算token数（约4字符/token）"""
+    return (len(text) + 3) // 4
+
+
+def _chunk_number(chunk_id: str) -> Optional[int]:
+    match = _CHUNK_NUMBER.search(chunk_id or '')
+    return int(match.group(1)) if match else None
+
+
+def _overlap(previous: List[str], current: List[str], max_words: int) -> int:
+    """Words at the start of ``current`` repeating the end of ``previous`` | 重叠词数"""
+    for k in range(min(max_words, len(previous), len(current)), 0, -1):
+        if previous[-k:] == current[:k]:
+            return k
+    return 0
+
+
+def split_sentences(text: str, max_words: int = MAX_SENTENCE_WORDS) -> List[str]:
+    """Split text into sentences, windowing overly long ones | 切分句子，过长的按窗口切分"""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        words = sentence.split()
+        for start in range(0, len(words), max_words):
+            sentences.append(' '.join(words[start:start + max_words]))
+    return sentences
+
+
+class ContextPacker:
+    """Deduplicate, rank and budget retrieved chunks | 去重、排序并按预算裁剪检索结果
+
+    ``pack`` takes chunk dicts (chunk_id, text, page, chapter) in retrieval
+    order and returns passages [{'page', 'chapter', 'chunk_ids', 'text'}]
+    in book order. Callers format each passage with its own citation style.
+    pack 接收按检索顺序排列的文本块，返回按原书顺序排列的段落，由调用方按各自格式添加引用。
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 overlap_words: int = DEFAULT_OVERLAP_WORDS):
+        self.token_budget = token_budget
+        self.overlap_words = overlap_words
+
+    def _segments(self, chunks: Sequence[Dict]) -> List[Dict]:
+        """Unique chunks in book order with overlap removed | 按原书顺序去除重叠后的文本段"""
+        ranked = []
+        seen = set()
+        for rank, chunk in enumerate(chunks):
+            if chunk['chunk_id'] in seen:
+                continue
+            seen.add(chunk['chunk_id'])
+            ranked.append((rank, chunk))
+
+        def book_order(item):
+            number = _chunk_number(item[1]['chunk_id'])
+            return (number is None, number if number is not None else item[0])
+        ranked.sort(key=book_order)
+
+        segments = []
+        previous_number, previous_words = None, []
+        for rank, chunk in ranked:
+            number = _chunk_number(chunk['chunk_id'])
+            words = chunk['text'].split()
+            if previous_number is not None and number == previous_number + 1:
+                words = words[_overlap(previous_words, words, self.overlap_words):]
+            segments.append({
+                'rank': rank,
+                'chunk_id': chunk['chunk_id'],
+                'page': chunk.get('page', 'N/A'),
+                'chapter': chunk.get('chapter') or 'N/A',
+                'text': ' '.join(words),
+            })
+            segments[-1]['continues'] = (previous_number is not None and number == previous_number + 1)
+            previous_number, previous_words = number, chunk['text'].split()
+        return segments
+
+    def pack(self, query: str, chunks: Sequence[Dict]) -> List[Dict]:
+        """Passages for the prompt, within the token budget | 预算内的上下文段落"""
+        sentences = []
+        for segment in self._segments(chunks):
+            for i, sentence in enumerate(split_sentences(segment['text'])):
+                sentences.append({
+                    'segment_info': segment,
+                    'text': sentence,
+                    # Directly follows the previous sentence in the book
+                    # 在原书中紧接上一句
+                    'follows': i > 0 or segment['continues'],
+                    'terms': set(tokenize(sentence)),
+                    'tokens': estimate_tokens(sentence) + 1,
+                })
+        if not sentences:
+            return []
+
+        # Query terms weighted by rarity among the candidate sentences, so
+        # words like "the" that appear everywhere barely count
+        # 查询词按在候选句子中的稀有程度加权，"the"等常见词几乎不计分
+        n = len(sentences)
+        weights = {}
+        for term in set(tokenize(query)):
+            df = sum(1 for s in sentences if term in s['terms'])
+            if df:
+                weights[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        for position, sentence in enumerate(sentences):
+            relevance = sum(w for term, w in weights.items() if term in sentence['terms'])
+            # Ties: better-ranked chunk first, then book order
+            # 同分时：检索排名靠前的文本块优先，其次按原书顺序
+            sentence['key'] = (-relevance, sentence['segment_info']['rank'], position)
+
+        kept = set()
+        used = 0
+        for position in sorted(range(n), key=lambda i: sentences[i]['key']):
+            cost = sentences[position]['tokens']
+            if used + cost <= self.token_budget:
+                kept.add(position)
+                used += cost
+
+        # Kept sentences in book order, one passage per page; gaps become "…"
+        # 保留的句子按原书顺序排列，每页一个段落；中间有省略时用 … 连接
+        passages = []
+        previous = None
+        for position in sorted(kept):
+            segment = sentences[position]['segment_info']
+            if passages and passages[-1]['page'] == segment['page']:
+                passage = passages[-1]
+                if passage['chunk_ids'][-1] != segment['chunk_id']:
+                    passage['chunk_ids'].append(segment['chunk_id'])
+                if position != previous + 1 or not sentences[position]['follows']:
+                    passage['sentences'].append('…')
+                passage['sentences'].append(sentences[position]['text'])
+            else:
+                passages.append({
+                    'page': segment['page'],
+                    'chapter': segment['chapter'],
+                    'chunk_ids': [segment['chunk_id']],
+                    'sentences': [sentences[position]['text']],
+                })
+            previous = position
+        for passage in passages:
+            passage['text'] = ' '.join(passage.pop('sentences'))
+        return passages
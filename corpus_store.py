@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact memory-mapped corpus format for the Family Law knowledge base
+家庭法知识库的紧凑内存映射语料格式
+
+Build step (writes family_law_chunks.bin next to the JSON):
+构建步骤（在JSON旁生成 family_law_chunks.bin）:
+
+    python3 corpus_store.py family_law_chunks.json
+
+File layout | 文件布局:
+    magic (8 bytes) | version u32 | directory length u32 | directory (JSON)
+    then 8-byte aligned sections, each a native array or a UTF-8 blob:
+    - text blob + offset table (text is decoded lazily, one chunk at a time)
+    - interned chapter / section / keyword string tables
+    - per-chunk page, source_page, word_count, char_count columns
+"""
+
+import os
+import sys
+import json
+import mmap
+import hashlib
+import tempfile
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, List, Optional, Union
+
+MAGIC = b'FLCORPUS'
+VERSION = 1
+_HEADER_SIZE = len(MAGIC) + 8
+_ALIGN = 8
+
+# Fields in the order of the original JSON chunk schema
+# 字段顺序与原JSON文本块结构一致
+CHUNK_FIELDS = ('text', 'page', 'chapter', 'section', 'keywords',
+                'word_count', 'char_count', 'chunk_id', 'source_page')
+_INT_COLUMNS = ('page', 'source_page', 'word_count', 'char_count')
+
+
+def chunk_content_hash(chunk) -> str:
+    """Stable hash of a chunk's text and location | 文本块内容与位置的稳定哈希
+
+    Changes whenever the text, page, chapter or section changes, so derived
+    indexes can tell which chunks need rebuilding.
+    正文、页码、章节或小节变化时哈希随之变化，派生索引据此判断需要重建的文本块。
+    """
+    h = hashlib.sha256()
+    for field in ('text', 'page', 'chapter', 'section'):
+        h.update(str(chunk.get(field)).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def corpus_version(json_path: str) -> str:
+    """Content hash of the chunks file | 语料文件的内容哈希
+
+    Caches derived from the corpus (e.g. answers) store this and are
+    invalidated when it changes.
+    由语料派生的缓存（如回答缓存）记录此值，语料变化时自动失效。
+    """
+    h = hashlib.sha256()
+    with open(json_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def default_corpus_path(json_path: str) -> str:
+    """Binary artifact path for a chunks JSON file | JSON文件对应的二进制文件路径"""
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def default_changes_path(json_path: str) -> str:
+    """Change-set path written by a delta build | 增量构建生成的变更集路径"""
+    return os.path.splitext(json_path)[0] + '.changes.json'
+
+
+def load_change_set(json_path: str) -> Optional[Dict]:
+    """Change set that produced this chunks file, if any | 生成该语料文件的变更集（如有）
+
+    A change set lists the chunk_ids added, modified and removed relative
+    to the previous build ('from_version' → 'to_version', both corpus_version
+    values). It is only returned if it describes the current file.
+    变更集列出相对上一次构建新增、修改和删除的 chunk_id（'from_version' → 'to_version'，
+    均为 corpus_version 值）。仅当它描述的是当前文件时才返回。
+    """
+    path = default_changes_path(json_path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            change_set = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if change_set.get('to_version') != corpus_version(json_path):
+        return None
+    return change_set
+
+
+class _StringTable:
+    """Interned strings: each distinct value stored once | 字符串驻留表"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: str) -> int:
+        if value not in self.ids:
+            self.ids[value] = len(self.values)
+            self.values.append(value)
+        return self.ids[value]
+
+
+def _encode_strings(values: List[str]):
+    """UTF-8 blob plus an n+1 offset table | UTF-8数据块加偏移表"""
+    offsets = array('Q', [0])
+    parts = []
+    for value in values:
+        encoded = value.encode('utf-8')
+        parts.append(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+    return offsets, b''.join(parts)
+
+
+def build_corpus(json_path: str, out_path: Optional[str] = None) -> str:
+    """Convert a chunks JSON file into the binary format | 将JSON转换为二进制格式
+
+    The file is written to a temporary name and renamed, so concurrent
+    readers never see a partial artifact. Raises ValueError if a chunk's
+    page, source_page, word_count or char_count is not an unsigned 32-bit
+    integer (e.g. None).
+    先写入临时文件再重命名，并发读取者不会看到不完整的文件。若文本块的 page、
+    source_page、word_count 或 char_count 不是无符号32位整数（如None），抛出ValueError。
+    """
+    out_path = out_path or default_corpus_path(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    chunks = data['chunks']
+
+    chapters, sections, keywords = _StringTable(), _StringTable(), _StringTable()
+    chapter_idx = array('i')
+    section_idx = array('i')
+    keyword_offsets = array('Q', [0])
+    keyword_ids = array('I')
+    columns = {name: array('I') for name in _INT_COLUMNS}
+
+    for chunk in chunks:
+        chapter = chunk.get('chapter')
+        section = chunk.get('section')
+        # -1 marks a missing value (some chunks have no section)
+        # -1 表示缺失值（部分文本块没有章节小节）
+        chapter_idx.append(chapters.intern(chapter) if chapter is not None else -1)
+        section_idx.append(sections.intern(section) if section is not None else -1)
+        keyword_ids.extend(keywords.intern(kw) for kw in chunk.get('keywords', []))
+        keyword_offsets.append(len(keyword_ids))
+        for name in _INT_COLUMNS:
+            value = chunk.get(name, 0)
+            # Stored as unsigned 32-bit; anything else keeps the JSON path
+            # 以无符号32位存储；其他值交由JSON路径处理
+            if type(value) is not int or not 0 <= value < 2 ** 32:
+                raise ValueError(f"Chunk {chunk.get('chunk_id')!r}: {name} {value!r} "
+                                 f"is not an unsigned 32-bit integer")
+            columns[name].append(value)
+
+    text_offsets, text_blob = _encode_strings([c['text'] for c in chunks])
+    chunk_id_offsets, chunk_id_blob = _encode_strings([c['chunk_id'] for c in chunks])
+
+    sections_out = {
+        'text_offsets': text_offsets,
+        'text': text_blob,
+        'chunk_id_offsets': chunk_id_offsets,
+        'chunk_id': chunk_id_blob,
+        'chapter_idx': chapter_idx,
+        'section_idx': section_idx,
+        'keyword_offsets': keyword_offsets,
+        'keyword_ids': keyword_ids,
+        'metadata': json.dumps(data.get('metadata', {}), ensure_ascii=False).encode('utf-8'),
+    }
+    for name, table in (('chapters', chapters), ('sections', sections), ('keywords', keywords)):
+        offsets, blob = _encode_strings(table.values)
+        sections_out[f'{name}_offsets'] = offsets
+        sections_out[name] = blob
+    sections_out.update(columns)
+
+    # Lay sections out after the header, each 8-byte aligned
+    # 在文件头之后依次排列各段，8字节对齐
+    payloads = {name: (value.tobytes() if isinstance(value, array) else value)
+                for name, value in sections_out.items()}
+    directory = {
+        'n_chunks': len(chunks),
+        'byteorder': sys.byteorder,
+        'sections': {},
+    }
+    # Directory size depends on offsets, so fix it with a generous pad
+    # 目录大小取决于偏移量，先预留足够空间
+    reserve = 64 * (len(payloads) + 4)
+    offset = _align(_HEADER_SIZE + reserve)
+    for name, payload in payloads.items():
+        value = sections_out[name]
+        typecode = value.typecode if isinstance(value, array) else 'B'
+        directory['sections'][name] = [offset, len(payload), typecode]
+        offset = _align(offset + len(payload))
+    directory_bytes = json.dumps(directory).encode('utf-8')
+    if len(directory_bytes) > reserve:
+        raise ValueError("Corpus directory exceeds reserved header space")
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(VERSION.to_bytes(4, 'little'))
+            f.write(len(directory_bytes).to_bytes(4, 'little'))
+            f.write(directory_bytes)
+            for name, payload in payloads.items():
+                f.seek(directory['sections'][name][0])
+                f.write(payload)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return out_path
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class ChunkRecord(Mapping):
+    """Read-only, lazily decoded chunk | 只读、按需解码的文本块
+
+    Behaves like the original chunk dict (``chunk['text']``,
+    ``chunk.get('page')``, ``'page' in chunk``) but reads each field from the
+    memory map only when accessed.
+    行为与原文本块字典相同，但字段仅在访问时从内存映射中读取。
+    """
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: 'CorpusStore', index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key: str):
+        if key not in CHUNK_FIELDS:
+            raise KeyError(key)
+        return self._store._field(self._index, key)
+
+    def __iter__(self):
+        return iter(CHUNK_FIELDS)
+
+    def __len__(self) -> int:
+        return len(CHUNK_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord({self._store.chunk_id(self._index)!r})"
+
+    def __reduce__(self):
+        return (self.__class__, (self._store, self._index))
+
+
+class CorpusStore(Sequence):
+    """Memory-mapped corpus, indexable like the original chunks list | 内存映射语料
+
+    Pickling stores only the path, so caches that copy their values reopen
+    the mapping instead of copying the corpus.
+    序列化时只保存路径，缓存复制时重新映射文件而不是复制语料。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a corpus file: {path}")
+        version = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 4], 'little')
+        if version != VERSION:
+            raise ValueError(f"Unsupported corpus version {version}: {path}")
+        directory_len = int.from_bytes(self._mmap[len(MAGIC) + 4:_HEADER_SIZE], 'little')
+        directory = json.loads(self._mmap[_HEADER_SIZE:_HEADER_SIZE + directory_len])
+        if directory['byteorder'] != sys.byteorder:
+            raise ValueError(f"Corpus was built on a {directory['byteorder']}-endian machine")
+
+        self._n = directory['n_chunks']
+        view = memoryview(self._mmap)
+        self._sections = {}
+        for name, (offset, length, typecode) in directory['sections'].items():
+            section = view[offset:offset + length]
+            self._sections[name] = section.cast(typecode) if typecode != 'B' else section
+
+        self._chapters = self._decode_all('chapters')
+        self._section_names = self._decode_all('sections')
+        self._keywords = self._decode_all('keywords')
+        self._metadata = None
+
+    def _decode_all(self, name: str) -> List[str]:
+        offsets = self._sections[f'{name}_offsets']
+        blob = self._sections[name]
+        return [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8')
+                for i in range(len(offsets) - 1)]
+
+    def _string(self, name: str, index: int) -> str:
+        offsets = self._sections[f'{name}_offsets']
+        return bytes(self._sections[name][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def _field(self, index: int, key: str):
+        if key == 'text':
+            return self.text(index)
+        if key == 'chunk_id':
+            return self.chunk_id(index)
+        if key == 'chapter':
+            idx = self._sections['chapter_idx'][index]
+            return self._chapters[idx] if idx >= 0 else None
+        if key == 'section':
+            idx = self._sections['section_idx'][index]
+            return self._section_names[idx] if idx >= 0 else None
+        if key == 'keywords':
+            offsets = self._sections['keyword_offsets']
+            ids = self._sections['keyword_ids'][offsets[index]:offsets[index + 1]]
+            return [self._keywords[i] for i in ids]
+        return self._sections[key][index]
+
+    def text(self, index: int) -> str:
+        """Decode one chunk's text | 解码单个文本块的正文"""
+        return self._string('text', index)
+
+    def chunk_id(self, index: int) -> str:
+        return self._string('chunk_id', index)
+
+    @property
+    def metadata(self) -> Dict:
+        """Corpus metadata from the source JSON | 源JSON中的语料元数据"""
+        if self._metadata is None:
+            self._metadata = json.loads(bytes(self._sections['metadata']).decode('utf-8'))
+        return self._metadata
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [ChunkRecord(self, i) for i in range(*index.indices(self._n))]
+        if index < 0:
+            index += self._n
+        if not 0 <= index < self._n:
+            raise IndexError("chunk index out of range")
+        return ChunkRecord(self, index)
+
+    def __reduce__(self):
+        return (self.__class__, (self.path,))
+
+
+def load_chunks(json_path: str) -> Sequence:
+    """Load chunks, preferring the memory-mapped artifact | 加载文本块，优先使用内存映射文件
+
+    The artifact is (re)built when it is missing or older than the JSON.
+    If it cannot be written (e.g. read-only deploy), the JSON is parsed as before.
+    二进制文件缺失或比JSON旧时会重新构建；无法写入时（如只读部署）回退为解析JSON。
+    """
+    bin_path = default_corpus_path(json_path)
+    try:
+        if (not os.path.exists(bin_path)
+                or os.path.getmtime(bin_path) < os.path.getmtime(json_path)):
+            build_corpus(json_path, bin_path)
+        return CorpusStore(bin_path)
+    except (OSError, ValueError):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['chunks']
+
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'family_law_chunks.json'
+    out_path = sys.argv[2] if len(sys.argv) > 2 else None
+    out_path = build_corpus(json_path, out_path)
+    store = CorpusStore(out_path)
+    print(f"✅ 已写入 {out_path}: {len(store)} 个文本块, "
+          f"{os.path.getsize(out_path) / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,25 +5,41 @@
 使用基础关键词匹配（无需额外依赖）
 """
 
-import json
 import re
+import sys
 from typing import List, Dict
 
+from corpus_store import load_chunks
+from query_expansion import expand_query
+from snippets import SnippetGenerator
+
 class SimpleLegalSearch:
-    def __init__(self, chunks_path: str):
+    def __init__(self, chunks_path: str, use_bm25: bool = False):
         """初始化搜索系统"""
         print("📖 加载知识库...")
-        with open(chunks_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        self.chunks = data['chunks']
+        self.chunks = load_chunks(chunks_path)
         print(f"✅ 已加载 {len(self.chunks)} 个文本块\n")
         
+        # 可选BM25排序（需要numpy和scipy）
+        self.bm25 = None
+        if use_bm25:
+            from bm25 import BM25Index
+            self.bm25 = BM25Index(self.chunks)
+            print("✅ 已启用BM25排序\n")
+        
+        # 预览摘要：基于加载时保存的词元偏移选取最匹配的片段（BM25模式复用其位置索引）
+        self.snippets = SnippetGenerator(self.chunks, self.bm25.positional if self.bm25 else None)
+        
     def simple_search(self, query: str, n: int = 5) -> List[Dict]:
         """简单的关键词+相关性搜索"""
         
-        # 提取查询关键词
+        # 中文术语扩展为英文词，再提取查询关键词
+        query = expand_query(query)
         keywords = set(re.findall(r'\w+', query.lower()))
         
+        if self.bm25:
+            return self.bm25_search(query, keywords, n)
+        
         # 计算每个chunk的相关性得分
         scored_chunks = []
         for chunk in self.chunks:
@@ -63,6 +79,15 @@ class SimpleLegalSearch:
         
         return scored_chunks[:n]
     
+    def bm25_search(self, query: str, keywords: set, n: int = 5) -> List[Dict]:
+        """BM25排序搜索，结果格式与 simple_search 相同"""
+        results = self.bm25.search(query, n_results=n)
+        for result in results:
+            text_terms = set(re.findall(r'\w+', result['chunk']['text'].lower()))
+            result['score'] = round(result['score'], 2)
+            result['matched_keywords'] = sorted(keywords & text_terms)
+        return results
+    
     def display_results(self, results: List[Dict], query: str):
         """显示搜索结果"""
         if not results:
@@ -72,6 +97,7 @@ class SimpleLegalSearch:
             print("   - 尝试英文查询以获得更好的结果")
             return
         
+        expanded = expand_query(query)
         print(f"\n🔍 搜索: '{query}'")
         print(f"✅ 找到 {len(results)} 个相关结果\n")
         print("="*80)
@@ -82,19 +108,13 @@ class SimpleLegalSearch:
             keywords = result['matched_keywords']
             
             print(f"\n【结果 #{i}】 相关度得分: {score}")
-            print(f"📄 页码: {chunk['page_number']}")
-            print(f"📚 章节: {chunk.get('chapter', 'N/A')[:70]}...")
-            print(f"🏷️  类型: {chunk['content_type']}")
+            print(f"📄 页码: {chunk['page']}")
+            print(f"📚 章节: {(chunk.get('chapter') or 'N/A')[:70]}...")
             print(f"🔑 匹配关键词: {', '.join(keywords)}")
             print(f"\n📝 内容预览:")
             
-            # 高亮显示关键词
-            preview = chunk['text'][:400]
-            for kw in keywords:
-                pattern = re.compile(re.escape(kw), re.IGNORECASE)
-                preview = pattern.sub(f"**{kw.upper()}**", preview)
-            
-            print(f"{preview}...")
+            # 最匹配的片段，关键词高亮
+            print(self.snippets.snippet(chunk, expanded, open_tag='**', close_tag='**', escape=str))
             print("\n" + "-"*80)
 
 def main():
@@ -104,8 +124,9 @@ def main():
     print("="*80)
     print()
     
-    # 初始化搜索系统
-    searcher = SimpleLegalSearch('/home/claude/family_law_chunks.json')
+    # 初始化搜索系统（--bm25 启用BM25排序）
+    searcher = SimpleLegalSearch('/home/claude/family_law_chunks.json',
+                                 use_bm25='--bm25' in sys.argv[1:])
     
     # 预设测试问题
     test_queries = {
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk embedding cache
+持久化的磁盘嵌入缓存
+
+Embeddings are stored per (model name, normalization) in a directory of
+float32 shards: ``shard_NNNNN.npy`` (memory-mapped for reading) with the
+text hash of each row in ``shard_NNNNN.json``, plus a small
+``manifest.json`` listing the live shards in order. Any indexing path can
+ask the store for embeddings; only texts it has never seen are encoded.
+New rows go to a new shard; a shard is merged with the one before it while
+that one is no larger, so a build writes O(n log n) rows in O(log n)
+shards instead of rewriting the whole matrix per batch. Shards are written
+before the manifest that lists them.
+每个（模型名, 是否归一化）组合对应一个目录，包含若干 float32 分片：shard_NNNNN.npy
+（以内存映射方式读取）及记录每行文本哈希的 shard_NNNNN.json，以及按顺序列出有效
+分片的小文件 manifest.json。任何索引流程都通过它获取嵌入，只有从未见过的文本才会
+被编码。新行写入新分片；当前一个分片不大于它时二者合并，因此一次构建共写入
+O(n log n) 行、保留 O(log n) 个分片，而不是每批重写整个矩阵。分片总在列出它的清单
+之前写入。
+"""
+
+import os
+import re
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from search_index import normalize_query
+
+# Sentence-transformers model used for chunks and queries
+# 文本块和查询使用的句向量模型
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+MANIFEST_VERSION = 1
+QUERY_CACHE_SIZE = 1024
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the exact text that is embedded | 被嵌入文本的SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _atomic_write(path: str, write) -> None:
+    """Write via a temp file + rename so readers never see partial files | 原子写入"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class EmbeddingStore:
+    """Embedding cache keyed by (text hash, model, normalization) | 嵌入缓存
+
+    Single writer per directory; any number of readers.
+    每个目录只允许一个写入者，读取者数量不限。
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, normalize: bool = False):
+        self.model_name = model_name
+        self.normalize = normalize
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        self.path = os.path.join(cache_dir, f"{safe_model}__{'norm' if normalize else 'raw'}")
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest_path = os.path.join(self.path, 'manifest.json')
+
+        # Hash → global row; shard names, their matrices and first rows
+        # 哈希 → 全局行号；各分片的名称、矩阵和起始行号
+        self.rows: Dict[str, int] = {}
+        self.shards: List[str] = []
+        self._matrices: List[np.ndarray] = []
+        self._starts: List[int] = []
+        self._next_shard = 0
+        self.dim = 0
+        self._load()
+
+    def _shard_path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.path, name + suffix)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._manifest_path):
+            return
+        with open(self._manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('version') != MANIFEST_VERSION
+                or manifest.get('model') != self.model_name
+                or manifest.get('normalize') != self.normalize):
+            return
+        self.dim = manifest.get('dim', 0)
+        self._next_shard = manifest.get('next_shard', 0)
+        for name in manifest['shards']:
+            with open(self._shard_path(name, '.json'), 'r', encoding='utf-8') as f:
+                hashes = json.load(f)
+            self._add_shard(name, np.load(self._shard_path(name, '.npy'), mmap_mode='r'), hashes)
+
+    def _add_shard(self, name: str, matrix: np.ndarray, hashes: List[str]) -> None:
+        start = self._starts[-1] + len(self._matrices[-1]) if self.shards else 0
+        self.shards.append(name)
+        self._matrices.append(matrix)
+        self._starts.append(start)
+        for offset, h in enumerate(hashes):
+            self.rows[h] = start + offset
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, text: str) -> bool:
+        return text_hash(text) in self.rows
+
+    def _append(self, hashes: List[str], embeddings: np.ndarray) -> None:
+        """Persist new rows as a shard, then the manifest that lists it | 先写分片，再写清单"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        hashes = list(hashes)
+        # Merge with trailing shards that are no larger (their rows keep
+        # their global numbers, since the merged shard starts where they did)
+        # 与不大于新分片的末尾分片合并（合并后分片起始位置不变，全局行号不变）
+        merged = []
+        while self.shards and len(self._matrices[-1]) <= len(embeddings):
+            name = self.shards.pop()
+            matrix = self._matrices.pop()
+            self._starts.pop()
+            with open(self._shard_path(name, '.json'), 'r', encoding='utf-8') as f:
+                hashes = json.load(f) + hashes
+            embeddings = np.concatenate([np.asarray(matrix), embeddings])
+            merged.append(name)
+
+        name = f"shard_{self._next_shard:05d}"
+        self._next_shard += 1
+        _atomic_write(self._shard_path(name, '.npy'), lambda f: np.save(f, embeddings))
+        _atomic_write(self._shard_path(name, '.json'),
+                      lambda f: f.write(json.dumps(hashes).encode('utf-8')))
+        self._add_shard(name, np.load(self._shard_path(name, '.npy'), mmap_mode='r'), hashes)
+        self.dim = int(embeddings.shape[1])
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'model': self.model_name,
+            'normalize': self.normalize,
+            'dim': self.dim,
+            'next_shard': self._next_shard,
+            'shards': self.shards,
+        }
+        _atomic_write(self._manifest_path,
+                      lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+        # Merged shards are no longer listed; an interrupted run leaves
+        # unlisted files that are ignored | 已合并的分片不再被清单引用
+        for old in merged:
+            for suffix in ('.npy', '.json'):
+                try:
+                    os.remove(self._shard_path(old, suffix))
+                except OSError:
+                    pass
+
+    def _gather(self, rows: Sequence[int]) -> np.ndarray:
+        """Embeddings at global rows, in order | 按全局行号取嵌入"""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = np.empty((len(rows), self.dim), dtype=np.float32)
+        shard_of = np.searchsorted(self._starts, rows, side='right') - 1
+        for shard in np.unique(shard_of):
+            mask = shard_of == shard
+            result[mask] = self._matrices[shard][rows[mask] - self._starts[shard]]
+        return result
+
+    def encode(self, model, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        """Embeddings for texts, encoding only cache misses | 获取嵌入，只编码缓存未命中的文本
+
+        ``model`` is a loaded SentenceTransformer for ``model_name``.
+        model 为与 model_name 对应的已加载 SentenceTransformer。
+        """
+        hashes = [text_hash(text) for text in texts]
+
+        missing: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in self.rows and h not in missing:
+                missing[h] = text
+
+        if missing:
+            new_embeddings = model.encode(
+                list(missing.values()),
+                batch_size=batch_size,
+                show_progress_bar=False,
+                normalize_embeddings=self.normalize,
+            )
+            self._append(list(missing.keys()), new_embeddings)
+
+        return self._gather([self.rows[h] for h in hashes])
+
+
+class QueryEncoder:
+    """Query embeddings from the already-loaded model, behind an LRU cache | 查询嵌入LRU缓存
+
+    Queries are normalized (case and whitespace) before lookup and encoding,
+    so repeated and example questions skip the encoder. Safe to share
+    between threads.
+    查询在查找和编码前先规范化（大小写、空白），重复问题和示例问题无需再次编码。
+    可在多线程间共享。
+    """
+
+    def __init__(self, model, normalize: bool = False, max_size: int = QUERY_CACHE_SIZE):
+        self.model = model
+        self.normalize = normalize
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, query: str) -> np.ndarray:
+        """Embedding for one query | 单个查询的嵌入"""
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+
+        embedding = np.asarray(
+            self.model.encode([key], show_progress_bar=False,
+                              normalize_embeddings=self.normalize)[0],
+            dtype=np.float32,
+        )
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return embedding
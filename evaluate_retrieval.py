@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retrieval quality vs. latency evaluation on the golden query set
+基于黄金查询集的检索质量与延迟评估
+
+golden_queries.json holds versioned English and Chinese questions, each
+labelled with the chunk_ids (and their pages) that answer it. Grade 2 is the
+answering passage and grade 1 a supporting one. Every backend from
+benchmark_search.py is run with and without zh→en query expansion. The
+harness reports recall@k, page recall@k (the apps cite pages), MRR and
+graded nDCG@k, overall and per language, next to per-query latency.
+Speed changes (pruning, quantization, caching) can then be judged by what
+they cost in relevance.
+golden_queries.json 为带版本号的中英文问题集，每个问题标注了能回答它的chunk_id
+及页码（2=直接回答，1=相关支撑）。对 benchmark_search.py 中的每个后端分别在开启
+和关闭中文查询扩展时运行，按总体和语言报告 recall@k、页码召回率、MRR、分级nDCG@k
+以及查询延迟，以便衡量速度优化对相关性的影响。
+
+Usage | 用法:
+    python3 evaluate_retrieval.py --backends bm25,inverted --k 5,10 --output eval_results.json
+"""
+
+import os
+import math
+import json
+import time
+import argparse
+import contextlib
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+from benchmark_search import BACKENDS, build_backend, latency_summary, git_commit
+from corpus_store import load_chunks
+
+DEFAULT_GOLDEN_SET = 'golden_queries.json'
+
+
+def load_golden_set(path: str = DEFAULT_GOLDEN_SET) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_golden_set(golden: Dict, chunks) -> List[str]:
+    """Labels that no longer match the corpus | 与当前语料不一致的标注"""
+    pages = {chunk['chunk_id']: chunk['page'] for chunk in chunks}
+    problems = []
+    for query in golden['queries']:
+        for label in query['relevant']:
+            if label['chunk_id'] not in pages:
+                problems.append(f"{query['id']}: {label['chunk_id']} 不在语料中")
+            elif pages[label['chunk_id']] != label['page']:
+                problems.append(f"{query['id']}: {label['chunk_id']} 页码为 "
+                                f"{pages[label['chunk_id']]}，标注为 {label['page']}")
+    return problems
+
+
+def query_metrics(ranked: Sequence[str], relevant: List[Dict], page_of: Dict[str, int],
+                  k_values: Sequence[int]) -> Dict[str, float]:
+    """recall@k, page_recall@k, ndcg@k and MRR for one query | 单个查询的评估指标"""
+    grades = {label['chunk_id']: label['grade'] for label in relevant}
+    relevant_pages = {label['page'] for label in relevant}
+    ideal = sorted(grades.values(), reverse=True)
+
+    metrics = {}
+    for k in k_values:
+        top = ranked[:k]
+        metrics[f'recall@{k}'] = sum(1 for chunk_id in top if chunk_id in grades) / len(grades)
+        top_pages = {page_of.get(chunk_id) for chunk_id in top}
+        metrics[f'page_recall@{k}'] = len(relevant_pages & top_pages) / len(relevant_pages)
+        dcg = sum((2 ** grades.get(chunk_id, 0) - 1) / math.log2(rank + 2)
+                  for rank, chunk_id in enumerate(top))
+        idcg = sum((2 ** grade - 1) / math.log2(rank + 2) for rank, grade in enumerate(ideal[:k]))
+        metrics[f'ndcg@{k}'] = dcg / idcg if idcg else 0.0
+
+    metrics['mrr'] = next(
+        (1.0 / rank for rank, chunk_id in enumerate(ranked, start=1) if chunk_id in grades), 0.0
+    )
+    return metrics
+
+
+def mean_metrics(rows: List[Dict[str, float]]) -> Dict[str, float]:
+    if not rows:
+        return {}
+    return {key: round(sum(row[key] for row in rows) / len(rows), 4) for key in rows[0]}
+
+
+def evaluate(backend: str, expand: bool, golden: Dict, corpus_path: str, work_dir: str,
+             k_values: Sequence[int], repeat: int, page_of: Dict[str, int]) -> Dict:
+    """Evaluate one backend configuration | 评估一个后端配置"""
+    result = {'backend': backend, 'expansion': expand}
+    if backend == 'demo' and not expand:
+        result['skipped'] = 'demo_search always expands queries'
+        return result
+
+    timings = {}
+    depth = max(k_values)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            _, search = build_backend(backend, corpus_path, work_dir, timings, expand=expand)
+            per_query, latencies = [], []
+            for query in golden['queries']:
+                ranked = search(query['query'], depth)  # warm-up | 预热
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    search(query['query'], depth)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                per_query.append({
+                    'id': query['id'],
+                    'language': query['language'],
+                    'retrieved': ranked,
+                    **query_metrics(ranked, query['relevant'], page_of, k_values),
+                })
+    except ImportError as e:
+        result['skipped'] = f"missing dependency: {e.name or e}"
+        return result
+
+    metric_keys = [key for key in per_query[0] if key not in ('id', 'language', 'retrieved')]
+    metrics = {'overall': mean_metrics([{key: row[key] for key in metric_keys} for row in per_query])}
+    for language in sorted({row['language'] for row in per_query}):
+        metrics[language] = mean_metrics([{key: row[key] for key in metric_keys}
+                                          for row in per_query if row['language'] == language])
+    result.update({
+        **{key: round(value, 4) for key, value in timings.items()},
+        'metrics': metrics,
+        'latency_ms': latency_summary(sorted(latencies)),
+        'per_query': per_query,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="黄金查询集检索评估（质量 + 延迟）")
+    parser.add_argument('--golden', default=DEFAULT_GOLDEN_SET, help="黄金查询集JSON")
+    parser.add_argument('--chunks', default='family_law_chunks.json', help="知识库JSON路径")
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help=f"要评估的后端，逗号分隔 (默认全部: {','.join(BACKENDS)})")
+    parser.add_argument('--expansion', default='on,off',
+                        help="中文查询扩展配置: on / off / on,off (默认 on,off)")
+    parser.add_argument('--k', default='5,10', help="评估截断位置，逗号分隔 (默认 5,10)")
+    parser.add_argument('--repeat', type=int, default=3, help="每个查询计时次数 (默认 3)")
+    parser.add_argument('--work-dir', default='./benchmark_data', help="嵌入缓存目录")
+    parser.add_argument('--output', default='eval_results.json', help="结果JSON路径")
+    args = parser.parse_args()
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"未知后端: {', '.join(sorted(unknown))}")
+    expansions = [setting.strip() == 'on' for setting in args.expansion.split(',') if setting.strip()]
+    k_values = sorted({int(k) for k in args.k.split(',') if k.strip()})
+
+    golden = load_golden_set(args.golden)
+    chunks = load_chunks(args.chunks)
+    page_of = {chunk['chunk_id']: chunk['page'] for chunk in chunks}
+    print(f"📋 黄金查询集 v{golden['version']}: {len(golden['queries'])} 个问题")
+    for problem in check_golden_set(golden, chunks):
+        print(f"  ⚠️  {problem}")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'golden_set': {'path': args.golden, 'version': golden['version'],
+                       'queries': len(golden['queries'])},
+        'k': k_values,
+        'results': [],
+    }
+
+    k = k_values[0]
+    print(f"\n{'后端':<14}{'扩展':<6}{f'R@{k}':>8}{f'页R@{k}':>8}{'MRR':>8}{f'nDCG@{k}':>9}"
+          f"{'p50ms':>9}{'p95ms':>9}")
+    for backend in backends:
+        for expand in expansions:
+            result = evaluate(backend, expand, golden, args.chunks, args.work_dir,
+                              k_values, args.repeat, page_of)
+            report['results'].append(result)
+            label = 'on' if expand else 'off'
+            if 'skipped' in result:
+                print(f"{backend:<14}{label:<6}  跳过 ({result['skipped']})")
+                continue
+            overall, latency = result['metrics']['overall'], result['latency_ms']
+            print(f"{backend:<14}{label:<6}{overall[f'recall@{k}']:>8.3f}"
+                  f"{overall[f'page_recall@{k}']:>8.3f}{overall['mrr']:>8.3f}"
+                  f"{overall[f'ndcg@{k}']:>9.3f}{latency['p50']:>9.2f}{latency['p95']:>9.2f}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
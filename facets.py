@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chapter, section and page-range filters backed by precomputed bitmaps
+基于预计算位图的章、节和页码范围过滤
+
+FacetIndex is built once at load time: one bitmap per chapter and per
+section (a Python int, bit i set for chunk i, so intersecting filters is
+one C-level AND), plus the chunks' pages in sorted order, so a page range
+is two binary searches. Search engines turn a SearchFilter into the set of
+allowed chunks before scoring, so a narrowed query touches fewer chunks
+instead of post-filtering the top k.
+FacetIndex 在加载时构建一次：每个章、节一个位图（Python整数，第i位对应第i个文本块，
+过滤条件求交只需一次C级按位与），另有按页码排序的数组，页码范围只需两次二分查找。
+搜索引擎在评分前把 SearchFilter 转换为允许的文本块集合，因此缩小范围的查询处理的
+文本块更少，而不是对前k结果做后过滤。
+"""
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Recent filters whose chunk lists are kept | 缓存文本块列表的最近过滤条件数
+FILTER_CACHE_SIZE = 256
+
+
+class SearchFilter:
+    """Restrict a search to chapters, sections and/or a page range | 将搜索限定在章、节或页码范围内
+
+    ``chapters`` and ``sections`` match any of the given values exactly;
+    ``pages`` is an inclusive (first, last) range. Unset facets do not
+    restrict, and an empty filter is falsy.
+    chapters 和 sections 精确匹配任一给定值；pages 为闭区间 (起始页, 结束页)。
+    未设置的条件不做限制；空过滤条件为假值。
+    """
+
+    def __init__(self, chapters: Sequence[str] = (), sections: Sequence[str] = (),
+                 pages: Optional[Tuple[int, int]] = None):
+        self.chapters = tuple(chapters)
+        self.sections = tuple(sections)
+        self.pages = tuple(pages) if pages is not None else None
+
+    def __bool__(self) -> bool:
+        return bool(self.chapters or self.sections or self.pages)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SearchFilter) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return f"SearchFilter(chapters={self.chapters}, sections={self.sections}, pages={self.pages})"
+
+    def _key(self) -> Tuple:
+        return (self.chapters, self.sections, self.pages)
+
+    def to_where(self) -> Optional[Dict]:
+        """Chroma ``where`` clause for the same filter | 等价的 Chroma where 条件"""
+        conditions = []
+        if self.chapters:
+            conditions.append({'chapter': {'$in': list(self.chapters)}})
+        if self.sections:
+            conditions.append({'section': {'$in': list(self.sections)}})
+        if self.pages:
+            conditions.append({'page': {'$gte': self.pages[0]}})
+            conditions.append({'page': {'$lte': self.pages[1]}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+    @classmethod
+    def from_where(cls, where: Optional[Dict]) -> 'SearchFilter':
+        """Parse the ``where`` clauses produced by to_where | 解析 to_where 生成的 where 条件
+
+        Also accepts plain equality ({'chapter': value}) and '$eq'.
+        Raises ValueError for anything else.
+        也接受简单相等（{'chapter': value}）和 '$eq'；其他形式抛出 ValueError。
+        """
+        chapters: List[str] = []
+        sections: List[str] = []
+        first, last = None, None
+        conditions = where.get('$and', [where]) if where else []
+        for condition in conditions:
+            for field, test in condition.items():
+                if not isinstance(test, dict):
+                    test = {'$eq': test}
+                for operator, value in test.items():
+                    if field in ('chapter', 'section') and operator in ('$eq', '$in'):
+                        values = [value] if operator == '$eq' else list(value)
+                        (chapters if field == 'chapter' else sections).extend(values)
+                    elif field == 'page' and operator in ('$eq', '$gte'):
+                        first = value if first is None else max(first, value)
+                        if operator == '$eq':
+                            last = value if last is None else min(last, value)
+                    elif field == 'page' and operator == '$lte':
+                        last = value if last is None else min(last, value)
+                    else:
+                        raise ValueError(f"Unsupported filter: {field} {operator}")
+        pages = None
+        if first is not None or last is not None:
+            pages = (first if first is not None else float('-inf'),
+                     last if last is not None else float('inf'))
+        return cls(chapters, sections, pages)
+
+
+def _bitmap(doc_ids: Sequence[int]) -> int:
+    """Bitmap with the given bits set, built in one pass | 一次构建置位给定序号的位图
+
+    Bits are set in a byte buffer that becomes the int once; OR-ing one
+    bit at a time into an int would copy the growing int for every bit.
+    先在字节缓冲区中置位，最后一次转换为整数；逐位对整数做按位或会在每一位都复制
+    不断增长的整数。
+    """
+    if not doc_ids:
+        return 0
+    data = bytearray((max(doc_ids) >> 3) + 1)
+    for doc_id in doc_ids:
+        data[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(data, 'little')
+
+
+class FacetIndex:
+    """Per-facet bitmaps and a sorted page array | 各分面位图与排序页码数组
+
+    ``records`` are chunks or vector-store metadata dicts with 'chapter',
+    'section' and 'page' (missing fields simply never match). Read-only
+    after construction.
+    records 为含 'chapter'、'section'、'page' 的文本块或向量库元数据（缺少的字段
+    不会匹配）。构建后只读。
+    """
+
+    def __init__(self, records: Sequence[Dict]):
+        self.size = len(records)
+        # Chunk positions per value first, then each bitmap built once
+        # 先收集每个取值的文本块序号，再为每个取值一次构建位图
+        chapter_docs: Dict[str, List[int]] = {}
+        section_docs: Dict[str, List[int]] = {}
+        paged = []
+        for doc_id, record in enumerate(records):
+            for field, docs in (('chapter', chapter_docs), ('section', section_docs)):
+                value = record.get(field)
+                if value is not None:
+                    docs.setdefault(value, []).append(doc_id)
+            page = record.get('page')
+            if isinstance(page, int):
+                paged.append((page, doc_id))
+        self.chapters: Dict[str, int] = {value: _bitmap(docs) for value, docs in chapter_docs.items()}
+        self.sections: Dict[str, int] = {value: _bitmap(docs) for value, docs in section_docs.items()}
+
+        paged.sort()
+        self.pages = [page for page, _ in paged]
+        self._page_order = [doc_id for _, doc_id in paged]
+        # Corpora are normally in page order, so a page range is one run of
+        # bits | 语料通常按页码排序，页码范围即一段连续的位
+        self._page_order_is_doc_order = self._page_order == list(range(self.size))
+        self.allowed_docs = lru_cache(maxsize=FILTER_CACHE_SIZE)(self._allowed_docs)
+
+    def page_range(self, first: float, last: float) -> int:
+        """Bitmap of chunks with first <= page <= last | 页码在闭区间内的文本块位图"""
+        start = bisect_left(self.pages, first)
+        end = bisect_right(self.pages, last)
+        if start >= end:
+            return 0
+        if self._page_order_is_doc_order:
+            return ((1 << (end - start)) - 1) << start
+        return _bitmap(self._page_order[start:end])
+
+    def select(self, search_filter: Optional[SearchFilter]) -> Optional[int]:
+        """Bitmap of chunks passing the filter, or None if it does not restrict
+        通过过滤的文本块位图；不做限制时返回None
+        """
+        if not search_filter:
+            return None
+        everything = allowed = (1 << self.size) - 1
+        if search_filter.chapters:
+            allowed &= _union(self.chapters, search_filter.chapters)
+        if search_filter.sections:
+            allowed &= _union(self.sections, search_filter.sections)
+        if search_filter.pages:
+            allowed &= self.page_range(*search_filter.pages)
+        return None if allowed == everything else allowed
+
+    def doc_ids(self, bitmap: int) -> List[int]:
+        """Chunk positions set in a bitmap, ascending | 位图中置位的文本块序号（升序）"""
+        doc_ids = []
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+        for byte_index, byte in enumerate(data):
+            # Skip empty bytes: narrow filters are mostly zeros
+            # 跳过全零字节：窄过滤条件的位图大多为0
+            if byte:
+                base = byte_index * 8
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        doc_ids.append(base + bit)
+        return doc_ids
+
+    def _allowed_docs(self, search_filter: Optional[SearchFilter]) -> Optional[List[int]]:
+        """Chunk positions passing the filter, or None if it does not restrict
+        通过过滤的文本块序号；不做限制时返回None
+
+        Called through the per-instance LRU cache ``allowed_docs``; callers
+        must not modify the list.
+        通过实例级LRU缓存 allowed_docs 调用；调用方不得修改返回的列表。
+        """
+        bitmap = self.select(search_filter)
+        return None if bitmap is None else self.doc_ids(bitmap)
+
+
+def bitmap_to_array(bitmap: int, size: int):
+    """Positions set in a bitmap as a NumPy int32 array (needs numpy) | 位图置位序号转为NumPy数组（需要numpy）"""
+    import numpy as np
+
+    packed = np.frombuffer(bitmap.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder='little')).astype(np.int32)
+
+
+def _union(bitmaps: Dict[str, int], values: Iterable[str]) -> int:
+    result = 0
+    for value in values:
+        result |= bitmaps.get(value, 0)
+    return result
@@ -2,29 +2,55 @@
 # -*- coding: utf-8 -*-
 """
 澳大利亚家庭法AI代理 - 快速原型
-使用Chroma向量数据库 + Claude API
+使用Chroma向量数据库（或进程内NumPy向量索引，--numpy）+ Claude API
 """
 
-import json
 import os
-from typing import List, Dict
-import anthropic
+import sys
+from typing import List, Dict, Optional
 
-print("📦 安装依赖包...")
-os.system("pip install chromadb sentence-transformers anthropic --break-system-packages -q")
+from answer_cache import answer_cache_key, open_answer_cache
+from context_packer import ContextPacker, DEFAULT_TOKEN_BUDGET
+from corpus_store import load_chunks, chunk_content_hash, corpus_version, load_change_set
+from query_expansion import expand_query
+from timing import span, traced
+# EMBEDDING_MODEL 同时作为向量库中的模型版本标记
+from embedding_store import EmbeddingStore, QueryEncoder, EMBEDDING_MODEL
+from facets import SearchFilter
+# anthropic / chromadb / sentence_transformers 在首次使用时才导入（不在启动时pip安装）
+from lazy_imports import require, import_report
 
-import chromadb
-from sentence_transformers import SentenceTransformer
-from chromadb.config import Settings
+# Claude模型和提示词版本（均为回答缓存键的一部分；修改提示词时请递增 PROMPT_VERSION）
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+PROMPT_VERSION = "cli-2"
 
 class FamilyLawAgent:
-    def __init__(self, chunks_path: str, db_path: str = "./family_law_db"):
-        """初始化家庭法AI代理"""
+    def __init__(self, chunks_path: str, db_path: str = "./family_law_db",
+                 embedding_cache_dir: str = "./embedding_cache",
+                 vector_backend: str = "chroma",
+                 answer_cache_path: str = "./answer_cache.sqlite3",
+                 context_tokens: int = DEFAULT_TOKEN_BUDGET):
+        """初始化家庭法AI代理
+        
+        vector_backend: "chroma"（Chroma持久化数据库）或 "numpy"（进程内精确索引，
+        保存为 db_path 下的单个 .npz 文件）
+        context_tokens: 发送给Claude的上下文token预算
+        """
+        if vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
         self.chunks_path = chunks_path
         self.db_path = db_path
+        self.embedding_cache_dir = embedding_cache_dir
+        self.vector_backend = vector_backend
+        self.answer_cache_path = answer_cache_path
+        self.answer_cache = None
+        # 合并相邻文本块、去除重叠并按预算保留最相关的句子
+        self.context_packer = ContextPacker(token_budget=context_tokens)
         self.chunks = None
         self.collection = None
         self.model = None
+        self.embedding_store = None
+        self.query_encoder = None
         self.claude_client = None
         
         print("\n🚀 初始化家庭法AI代理...")
@@ -32,73 +58,149 @@ class FamilyLawAgent:
     def load_chunks(self):
         """加载文本块数据"""
         print("📖 加载知识库...")
-        with open(self.chunks_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        self.chunks = data['chunks']
+        self.chunks = load_chunks(self.chunks_path)
         print(f"✅ 已加载 {len(self.chunks)} 个文本块")
         
     def initialize_embedding_model(self):
         """初始化嵌入模型"""
         print("\n🤖 加载嵌入模型 (首次运行会下载模型，请稍候)...")
+        sentence_transformers = require('sentence_transformers', "嵌入模型")
         # 使用轻量级但效果好的模型
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ 嵌入模型加载完成")
+        self.model = sentence_transformers.SentenceTransformer(EMBEDDING_MODEL)
+        # 磁盘嵌入缓存：重建索引或更换向量库时不再重复编码
+        self.embedding_store = EmbeddingStore(self.embedding_cache_dir, EMBEDDING_MODEL)
+        # 查询也用同一个模型编码（带LRU缓存），避免Chroma再加载默认嵌入模型
+        self.query_encoder = QueryEncoder(self.model)
+        print(f"✅ 嵌入模型加载完成 (缓存中已有 {len(self.embedding_store)} 个嵌入)")
         
     def create_vector_database(self):
-        """创建向量数据库"""
-        print("\n💾 创建Chroma向量数据库...")
+        """打开（或创建）持久化向量数据库"""
+        if self.vector_backend == "numpy":
+            from vector_index import NumpyVectorIndex
+            
+            print("\n💾 加载NumPy向量索引...")
+            self.collection = NumpyVectorIndex.load(os.path.join(self.db_path, "family_law.npz"))
+            print(f"  ✓ 索引就绪 (现有 {self.collection.count()} 个文本块)")
+            return
+        
+        chromadb = require('chromadb', "Chroma向量数据库")
+        
+        print("\n💾 打开Chroma向量数据库...")
         
         # 初始化Chroma客户端
         self.client = chromadb.PersistentClient(path=self.db_path)
         
-        # 删除旧集合（如果存在）
-        try:
-            self.client.delete_collection("family_law")
-            print("  ⚠️  删除旧数据库")
-        except:
-            pass
-        
-        # 创建新集合
-        self.collection = self.client.create_collection(
+        # 保留已有集合，由 index_documents 增量更新
+        self.collection = self.client.get_or_create_collection(
             name="family_law",
             metadata={"description": "Australian Family Law Knowledge Base"}
         )
         
-        print("  ✓ 数据库创建成功")
+        print(f"  ✓ 数据库就绪 (现有 {self.collection.count()} 个文本块)")
+        
+    @traced('index_documents')
+    def index_documents(self, batch_size: int = 100, change_set: Optional[Dict] = None):
+        """增量索引文档到向量数据库
         
-    def index_documents(self, batch_size: int = 100):
-        """索引所有文档到向量数据库"""
-        print(f"\n📊 开始索引文档 (共 {len(self.chunks)} 个文本块)...")
+        每个文本块带有内容哈希和嵌入模型标记；只对新增或变化的文本块
+        生成嵌入并upsert，已从知识库删除的chunk_id会从数据库中移除。
+        传入增量构建的变更集（见 ingest_pdf.py）时只检查其中新增/修改/删除的
+        chunk_id，不扫描整个数据库；若结果与知识库数量不符则退回全量比对。
+        """
+        print(f"\n📊 检查索引 (共 {len(self.chunks)} 个文本块)...")
         
-        total_chunks = len(self.chunks)
+        # 数据库中已有的哈希和模型标记
+        with span('scan_existing'):
+            if change_set:
+                touched = set(change_set['added']) | set(change_set['modified'])
+                existing = self.collection.get(ids=sorted(touched), include=['metadatas'])
+            else:
+                existing = self.collection.get(include=['metadatas'])
+        indexed = {}
+        for chunk_id, meta in zip(existing['ids'], existing['metadatas']):
+            meta = meta or {}
+            indexed[chunk_id] = (meta.get('content_hash'), meta.get('embedding_model'))
+            # 旧记录没有 section 元数据（过滤用），视为需要重写；嵌入来自缓存，无需重新编码
+            if 'section' not in meta:
+                indexed[chunk_id] = (None, None)
         
-        for i in range(0, total_chunks, batch_size):
-            batch = self.chunks[i:i+batch_size]
-            batch_end = min(i+batch_size, total_chunks)
+        # 找出新增或变化的文本块
+        current_ids = set()
+        pending = []
+        with span('diff'):
+            for chunk in self.chunks:
+                chunk_id = chunk['chunk_id']
+                current_ids.add(chunk_id)
+                if change_set and chunk_id not in touched:
+                    continue
+                content_hash = chunk_content_hash(chunk)
+                if indexed.get(chunk_id) != (content_hash, EMBEDDING_MODEL):
+                    pending.append((chunk, content_hash))
+        
+        # 删除知识库中已不存在的文本块
+        if change_set:
+            removed = [chunk_id for chunk_id in change_set['removed'] if chunk_id not in current_ids]
+        else:
+            removed = [chunk_id for chunk_id in indexed if chunk_id not in current_ids]
+        if removed:
+            with span('delete', chunks=len(removed)):
+                self.collection.delete(ids=removed)
+            print(f"  ✓ 已删除 {len(removed)} 个过期文本块")
+        
+        if not pending:
+            if removed:
+                self.save_vector_index()
+            if change_set and self.collection.count() != len(self.chunks):
+                # 数据库并非与上一版本同步，变更集不足以补齐
+                print("  变更集与数据库不一致，改为全量比对")
+                return self.index_documents(batch_size)
+            print("✅ 索引已是最新，无需重新嵌入")
+            return
+        
+        print(f"  需要写入 {len(pending)} 个新增/变化的文本块")
+        total_pending = len(pending)
+        
+        for i in range(0, total_pending, batch_size):
+            batch = pending[i:i+batch_size]
+            batch_end = min(i+batch_size, total_pending)
             
             # 准备批次数据
-            ids = [chunk['chunk_id'] for chunk in batch]
-            documents = [chunk['text'] for chunk in batch]
+            ids = [chunk['chunk_id'] for chunk, _ in batch]
+            documents = [chunk['text'] for chunk, _ in batch]
             metadatas = [{
-                'page': chunk['page_number'],
-                'chapter': chunk.get('chapter', 'N/A')[:200],  # 限制长度
-                'content_type': chunk['content_type'],
-                'word_count': chunk['metadata']['word_count']
-            } for chunk in batch]
+                'page': chunk['page'],
+                'chapter': (chunk.get('chapter') or 'N/A')[:200],  # 限制长度
+                'section': (chunk.get('section') or 'N/A')[:200],
+                'word_count': chunk['word_count'],
+                'content_hash': content_hash,
+                'embedding_model': EMBEDDING_MODEL
+            } for chunk, content_hash in batch]
             
-            # 生成嵌入并添加到数据库
-            embeddings = self.model.encode(documents, show_progress_bar=False)
+            # 获取嵌入（只编码缓存中没有的文本）并写入数据库
+            with span('embed', chunks=len(batch)):
+                embeddings = self.embedding_store.encode(self.model, documents)
             
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas,
-                embeddings=embeddings.tolist()
-            )
+            with span('upsert', chunks=len(batch)):
+                self.collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas,
+                    embeddings=embeddings.tolist()
+                )
             
-            print(f"  ✓ 已索引 {batch_end}/{total_chunks} 个文本块 ({batch_end*100//total_chunks}%)")
+            print(f"  ✓ 已索引 {batch_end}/{total_pending} 个文本块 ({batch_end*100//total_pending}%)")
         
+        self.save_vector_index()
+        if change_set and self.collection.count() != len(self.chunks):
+            print("  变更集与数据库不一致，改为全量比对")
+            return self.index_documents(batch_size)
         print("✅ 索引完成!")
+    
+    def save_vector_index(self):
+        """保存NumPy向量索引（Chroma会自动持久化）"""
+        if self.vector_backend == "numpy":
+            with span('save'):
+                self.collection.save()
         
     def setup_claude(self, api_key: str = None):
         """设置Claude API"""
@@ -109,55 +211,67 @@ class FamilyLawAgent:
             api_key = os.environ.get('ANTHROPIC_API_KEY')
         
         if api_key:
+            anthropic = require('anthropic', "Claude API")
             self.claude_client = anthropic.Anthropic(api_key=api_key)
+            # 与 app_pro.py 共用的回答缓存，语料变化时自动失效
+            if self.answer_cache_path:
+                self.answer_cache = open_answer_cache(self.answer_cache_path,
+                                                      corpus_version(self.chunks_path),
+                                                      change_set=load_change_set(self.chunks_path))
             print("✅ Claude API配置成功")
         else:
             print("⚠️  未找到API密钥，将只使用检索功能")
             print("   提示: 设置环境变量 ANTHROPIC_API_KEY 或在代码中提供")
         
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
+    def search(self, query: str, n_results: int = 5,
+               search_filter: Optional[SearchFilter] = None) -> List[Dict]:
         """检索相关法律内容"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        
-        # 格式化结果
-        formatted_results = []
-        for i in range(len(results['documents'][0])):
-            formatted_results.append({
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i] if 'distances' in results else None
-            })
-        
-        return formatted_results
+        return self.search_many([query], n_results, search_filter)[0]
     
-    def ask(self, question: str, n_results: int = 5) -> str:
-        """向AI代理提问"""
+    def search_many(self, queries: List[str], n_results: int = 5,
+                    search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """批量检索：所有查询一次提交给向量库（NumPy后端为一次矩阵乘法）
         
-        # 1. 检索相关内容
-        print(f"\n🔍 检索相关法律内容...")
-        search_results = self.search(question, n_results)
+        嵌入模型只支持英文，中文术语先扩展为英文词。
+        search_filter 限定章、节或页码范围（作为 where 条件传给向量库，评分前过滤）。
+        """
+        with span('encode_query'):
+            embeddings = [self.query_encoder.encode(expand_query(q)).tolist() for q in queries]
+        where = search_filter.to_where() if search_filter else None
+        with span('vector_query'):
+            results = self.collection.query(query_embeddings=embeddings, n_results=n_results,
+                                            where=where)
         
-        print(f"✓ 找到 {len(search_results)} 个相关段落")
-        for i, result in enumerate(search_results, 1):
-            print(f"  {i}. 页码 {result['metadata']['page']} | 相关度: {1-result['distance']:.2f}")
+        # 格式化结果
+        all_results = []
+        for q in range(len(queries)):
+            formatted_results = []
+            for i in range(len(results['documents'][q])):
+                formatted_results.append({
+                    'chunk_id': results['ids'][q][i],
+                    'text': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i] if 'distances' in results else None
+                })
+            all_results.append(formatted_results)
         
-        # 2. 构建上下文
-        context = "\n\n---\n\n".join([
-            f"[来源: 页码 {r['metadata']['page']}, 章节: {r['metadata']['chapter'][:60]}]\n{r['text']}"
-            for r in search_results
+        return all_results
+    
+    def build_context(self, question: str, search_results: List[Dict]) -> str:
+        """把检索结果组装为带页码来源的上下文（去除重叠，受token预算限制）"""
+        passages = self.context_packer.pack(expand_query(question), [{
+            'chunk_id': r['chunk_id'],
+            'text': r['text'],
+            'page': r['metadata']['page'],
+            'chapter': r['metadata']['chapter'],
+        } for r in search_results])
+        return "\n\n---\n\n".join([
+            f"[来源: 页码 {p['page']}, 章节: {p['chapter'][:60]}]\n{p['text']}"
+            for p in passages
         ])
-        
-        # 3. 如果没有Claude API，只返回检索结果
-        if not self.claude_client:
-            print("\n⚠️  未配置Claude API，返回原始检索结果:")
-            return context
-        
-        # 4. 调用Claude生成回答
-        print("\n🤔 Claude正在分析...")
-        
+    
+    def build_request(self, question: str, context: str) -> Dict:
+        """构建Claude请求参数（同步、流式和批量异步调用共用）"""
         system_prompt = f"""你是澳大利亚家庭法专家AI助手，基于《The Family Law Book》为用户提供帮助。
 
 【重要规则】
@@ -176,35 +290,113 @@ class FamilyLawAgent:
 如果用户问题超出提供的内容范围，请诚实说明，并建议查阅完整的家庭法手册或咨询律师。
 """
 
+        return dict(
+            model=CLAUDE_MODEL,
+            max_tokens=2000,
+            temperature=0.3,  # 降低温度使回答更准确
+            system=system_prompt,
+            messages=[
+                {"role": "user", "content": question}
+            ]
+        )
+    
+    def answer_cache_key(self, question: str, search_results: List[Dict]) -> str:
+        """回答缓存键：问题 + 模型 + 提示词版本 + 上下文chunk_id"""
+        # 上下文预算会改变提示词内容，因此计入提示词版本
+        prompt_version = f"{PROMPT_VERSION}/{self.context_packer.token_budget}"
+        return answer_cache_key(question, 'auto', CLAUDE_MODEL, prompt_version,
+                                [r['chunk_id'] for r in search_results])
+    
+    @traced('ask')
+    def ask(self, question: str, n_results: int = 5, stream: bool = False,
+            search_filter: Optional[SearchFilter] = None) -> str:
+        """向AI代理提问
+        
+        stream=True 时回答边生成边打印到终端（首个token即可见），
+        检索回退内容也直接打印；返回值始终为完整回答文本。
+        search_filter 将检索限定在指定章、节或页码范围内。
+        """
+        
+        # 1. 检索相关内容
+        print(f"\n🔍 检索相关法律内容...")
+        with span('retrieve'):
+            search_results = self.search(question, n_results, search_filter)
+        
+        print(f"✓ 找到 {len(search_results)} 个相关段落")
+        for i, result in enumerate(search_results, 1):
+            print(f"  {i}. 页码 {result['metadata']['page']} | 相关度: {1-result['distance']:.2f}")
+        
+        # 2. 构建上下文
+        with span('build_context'):
+            context = self.build_context(question, search_results)
+        
+        # 3. 如果没有Claude API，只返回检索结果
+        if not self.claude_client:
+            print("\n⚠️  未配置Claude API，返回原始检索结果:")
+            if stream:
+                print(context)
+            return context
+        
+        # 4. 相同问题+相同上下文直接使用缓存回答
+        cache_key = None
+        if self.answer_cache is not None:
+            cache_key = self.answer_cache_key(question, search_results)
+            with span('cache_lookup'):
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                print("\n⚡ 使用缓存回答")
+                if stream:
+                    print("\n💡 回答:")
+                    print(cached)
+                return cached
+        
+        # 5. 调用Claude生成回答
+        print("\n🤔 Claude正在分析...")
+        
+        request = self.build_request(question, context)
+        
         try:
-            message = self.claude_client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2000,
-                temperature=0.3,  # 降低温度使回答更准确
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": question}
-                ]
-            )
+            if stream:
+                # 流式输出：token到达即打印
+                print("\n💡 回答:")
+                parts = []
+                with span('claude_call', stream=True), \
+                        self.claude_client.messages.stream(**request) as response:
+                    for text in response.text_stream:
+                        print(text, end="", flush=True)
+                        parts.append(text)
+                print("\n")
+                answer = "".join(parts)
+            else:
+                with span('claude_call', stream=False):
+                    message = self.claude_client.messages.create(**request)
+                answer = message.content[0].text
             
-            answer = message.content[0].text
+            if cache_key:
+                with span('cache_store'):
+                    self.answer_cache.put(cache_key, answer, [r['chunk_id'] for r in search_results])
             print("✅ 回答生成完成\n")
             return answer
             
         except Exception as e:
             print(f"❌ Claude API调用失败: {e}")
-            return f"检索到的相关内容:\n\n{context}"
+            fallback = f"检索到的相关内容:\n\n{context}"
+            if stream:
+                print(fallback)
+            return fallback
     
     def setup(self):
         """完整设置流程"""
         self.load_chunks()
         self.initialize_embedding_model()
         self.create_vector_database()
-        self.index_documents()
+        self.index_documents(change_set=load_change_set(self.chunks_path))
         self.setup_claude()
         
         print("\n" + "="*80)
         print("🎉 家庭法AI代理设置完成！")
+        if import_report():
+            print(f"⏱️  依赖导入耗时: {import_report()}")
         print("="*80)
 
 def main():
@@ -213,10 +405,12 @@ def main():
     print("🏛️  澳大利亚家庭法AI代理 - 快速原型")
     print("="*80)
     
-    # 初始化代理
+    # 初始化代理（--numpy 使用进程内NumPy向量索引代替Chroma）
     agent = FamilyLawAgent(
         chunks_path="/home/claude/family_law_chunks.json",
-        db_path="/home/claude/family_law_db"
+        db_path="/home/claude/family_law_db",
+        embedding_cache_dir="/home/claude/embedding_cache",
+        vector_backend="numpy" if "--numpy" in sys.argv[1:] else "chroma"
     )
     
     # 设置系统
@@ -242,10 +436,8 @@ def main():
                 print("\n👋 再见！")
                 break
             
-            # 获取回答
-            answer = agent.ask(question)
-            print("\n💡 回答:")
-            print(answer)
+            # 获取回答（流式打印）
+            agent.ask(question, stream=True)
             print()
             
         except KeyboardInterrupt:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hybrid keyword + vector retrieval with reciprocal rank fusion
+关键词 + 向量混合检索（倒数排名融合）
+
+The keyword scorer and the vector query run concurrently on a thread pool,
+so the combined latency is close to the slower of the two. Their rankings
+are fused with reciprocal rank fusion (RRF), which needs no score
+calibration between BM25 scores and cosine distances.
+关键词评分和向量查询在线程池中并发执行，总延迟接近两者中较慢的一个。
+两个排序用RRF融合，无需校准BM25分数与余弦距离。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from facets import SearchFilter
+from timing import span, run_in_context
+
+# Standard RRF damping constant | RRF标准平滑常数
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum 1 / (k + rank) | 融合多个排序列表
+
+    Returns (id, score) pairs, best first; ties keep first-seen order.
+    返回按得分降序的（id, 得分）列表；同分时保持首次出现的顺序。
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def vector_ranking(collection, query_encoder
+                   ) -> Callable[[str, int, Optional[SearchFilter]], List[str]]:
+    """Ranked chunk_ids from a Chroma collection or NumpyVectorIndex | 向量库检索的chunk_id排序
+
+    Works with any store exposing Chroma's query(query_embeddings=...,
+    n_results=..., where=...); a SearchFilter is passed on as ``where``.
+    适用于任何提供 Chroma 风格 query() 接口的向量库；SearchFilter 以 where 传入。
+    """
+    def search(query: str, n_results: int,
+               search_filter: Optional[SearchFilter] = None) -> List[str]:
+        with span('encode_query'):
+            embedding = query_encoder.encode(query).tolist()
+        where = search_filter.to_where() if search_filter else None
+        with span('vector_query'):
+            results = collection.query(query_embeddings=[embedding], n_results=n_results,
+                                       where=where)
+        return results['ids'][0]
+    return search
+
+
+class HybridRetriever:
+    """Concurrent keyword + vector retrieval fused with RRF | 并发混合检索
+
+    ``keyword_index`` is any engine with search(query, n_results) returning
+    [{'chunk', 'score'}] (BM25Index / InvertedIndex). ``vector_search`` maps
+    (query, n_results, search_filter) to ranked chunk_ids. Results use the same
+    [{'chunk', 'score'}] shape, so they feed generate_ai_answer unchanged.
+    Safe to share between sessions: the pool is thread-safe and nothing is
+    mutated after construction.
+    keyword_index 为返回 [{'chunk', 'score'}] 的关键词引擎；vector_search 返回排序后的
+    chunk_id。结果格式与关键词搜索相同，可直接传给 generate_ai_answer。
+    """
+
+    def __init__(self, chunks: Sequence[Dict], keyword_index,
+                 vector_search: Callable[[str, int, Optional[SearchFilter]], List[str]],
+                 candidates: int = 20, rrf_k: int = RRF_K, max_workers: int = 4):
+        self.keyword_index = keyword_index
+        self.vector_search = vector_search
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.chunks_by_id = {chunk['chunk_id']: chunk for chunk in chunks}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='hybrid-search')
+
+    def _keyword_ranking(self, query: str, n_results: int,
+                         search_filter: Optional[SearchFilter]) -> List[str]:
+        with span('keyword'):
+            results = self.keyword_index.search(query, n_results=n_results,
+                                                search_filter=search_filter)
+            return [result['chunk']['chunk_id'] for result in results]
+
+    def _vector_ranking(self, query: str, n_results: int,
+                        search_filter: Optional[SearchFilter]) -> List[str]:
+        with span('vector'):
+            return self.vector_search(query, n_results, search_filter)
+
+    def search(self, query: str, n_results: int = 5,
+               search_filter: Optional[SearchFilter] = None) -> List[Dict]:
+        """Hybrid search, both sides restricted by the same filter | 混合搜索，两路使用同一过滤条件"""
+        depth = max(self.candidates, n_results)
+        keyword_future = run_in_context(self._executor, self._keyword_ranking,
+                                        query, depth, search_filter)
+        vector_future = run_in_context(self._executor, self._vector_ranking,
+                                       query, depth, search_filter)
+        rankings = [keyword_future.result(), vector_future.result()]
+        with span('fuse'):
+            fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        results = [
+            {'chunk': self.chunks_by_id[chunk_id], 'score': score}
+            for chunk_id, score in fused
+            if chunk_id in self.chunks_by_id
+        ]
+        return results[:n_results]
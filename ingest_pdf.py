@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel, streaming PDF → chunks ingestion
+并行流式 PDF → 文本块提取
+
+    python3 ingest_pdf.py Family_Law.pdf --output family_law_chunks.json --workers 8
+    # Quarterly update: keep chunk_ids, write family_law_chunks.changes.json
+    # 季度更新：保留 chunk_id，并写出 family_law_chunks.changes.json
+    python3 ingest_pdf.py Family_Law.pdf --previous family_law_chunks.json --output family_law_chunks.json
+
+Page text is extracted with pdfplumber in a process pool, a batch of pages
+per task, so every core works on its own part of the book. Batches come
+back in page order and are chunked as they arrive: chapter and section
+headings carry over from page to page, so that step stays in the main
+process. Chunks are streamed to a spool file as they are produced, then
+the corpus (metadata first, same layout and chunk schema as the original
+family_law_chunks.json) and extraction_stats.json are written atomically.
+页面文本在进程池中用 pdfplumber 提取，每个任务处理一批页面，每个核心处理书的一部分。
+各批结果按页码顺序返回并立即切块：章、节标题跨页延续，因此这一步在主进程中完成。
+文本块生成后即流式写入临时文件，最后原子写入语料文件（元数据在前，布局和文本块结构
+与原 family_law_chunks.json 相同）和 extraction_stats.json。
+
+Each page is split into windows of CHUNK_SIZE words that overlap by
+CHUNK_OVERLAP words; windows shorter than MIN_CHUNK_SIZE words are dropped.
+每页按 CHUNK_SIZE 个词切分窗口，相邻窗口重叠 CHUNK_OVERLAP 个词；不足
+MIN_CHUNK_SIZE 个词的窗口被丢弃。
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from corpus_store import chunk_content_hash, corpus_version, default_changes_path
+from lazy_imports import require
+
+# Chunking parameters, recorded in metadata.chunking_config | 切块参数，记录在 metadata.chunking_config
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+MIN_CHUNK_SIZE = 50
+# Pages per pool task: small enough to balance, large enough that opening
+# the PDF in each task is cheap | 每个任务的页数：足够小以均衡负载，足够大以摊薄打开PDF的开销
+PAGE_BATCH = 8
+KEYWORDS_PER_CHUNK = 10
+# Alphabetical keyword sample kept in the metadata | 元数据中保留的关键词样本数（按字母序）
+TOP_KEYWORDS = 50
+
+# "CHAPTER SEVEN – PROPERTY": a whole line with no lowercase letters
+CHAPTER_PATTERN = re.compile(r'^CHAPTER [A-Z]+ [–-] [^a-z]+$')
+# Running headers end with a book page reference: "PROPERTY 7 – 45"
+RUNNING_HEADER_PATTERN = re.compile(r'\d+\s*[–-]\s*\d+$')
+KEYWORD_PATTERN = re.compile(r'\b[a-z]{4,}\b')
+KEYWORD_STOPWORDS = frozenset("""
+    about above after again against also among because been before being below
+    between both could does doing down during each from further have having here
+    into itself just more most must only other over same should some than that
+    their theirs them then there these they this those through under until very
+    were what when where which while whom will with within would your yours
+""".split())
+
+
+def chunk_windows(words: Sequence[str]) -> List[List[str]]:
+    """Overlapping word windows of one page | 一页的重叠词窗口"""
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    windows = (list(words[start:start + CHUNK_SIZE]) for start in range(0, len(words), step))
+    return [window for window in windows if len(window) >= MIN_CHUNK_SIZE]
+
+
+def extract_keywords(text: str) -> List[str]:
+    """Most frequent content words of a chunk | 文本块中出现最多的实词"""
+    words = (word for word in KEYWORD_PATTERN.findall(text.lower())
+             if word not in KEYWORD_STOPWORDS)
+    return [word for word, _ in Counter(words).most_common(KEYWORDS_PER_CHUNK)]
+
+
+def page_hash(words: Sequence[str]) -> str:
+    """Hash of a page's words, ignoring layout whitespace | 页面词序列的哈希（忽略排版空白）"""
+    return hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest()[:16]
+
+
+def is_section_heading(line: str) -> bool:
+    """All-caps heading line that is not a chapter or running header | 全大写的小节标题行"""
+    letters = [ch for ch in line if ch.isalpha()]
+    return (len(letters) >= 4 and line.isupper() and len(line) <= 100
+            and not line.startswith('CHAPTER ')
+            and not RUNNING_HEADER_PATTERN.search(line))
+
+
+def page_count(pdf_path: str) -> int:
+    pdfplumber = require('pdfplumber', "PDF ingestion")
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_batch(pdf_path: str, page_numbers: Sequence[int]) -> List[Tuple[int, List[str]]]:
+    """Text lines of some pages (1-based), run in a worker process | 提取若干页的文本行（在工作进程中运行）"""
+    pdfplumber = require('pdfplumber', "PDF ingestion")
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number in page_numbers:
+            text = pdf.pages[page_number - 1].extract_text() or ''
+            lines = [' '.join(line.split()) for line in text.splitlines()]
+            pages.append((page_number, [line for line in lines if line]))
+    return pages
+
+
+def iter_pages(pdf_path: str, workers: Optional[int] = None,
+               batch_size: int = PAGE_BATCH) -> Iterator[Tuple[int, List[str]]]:
+    """(page number, lines) for every page, in order | 按顺序返回每页的（页码, 文本行）
+
+    ``workers`` defaults to the number of CPUs; 1 extracts in this process.
+    Batches are yielded as soon as they and all earlier ones are done.
+    workers 默认为CPU数；为1时在当前进程中提取。一批及其之前的批次完成后立即返回。
+    """
+    total = page_count(pdf_path)
+    batches = [range(first, min(first + batch_size, total + 1))
+               for first in range(1, total + 1, batch_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for batch in batches:
+            yield from extract_page_batch(pdf_path, batch)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches) or 1)) as executor:
+        for pages in executor.map(partial(extract_page_batch, pdf_path), batches):
+            yield from pages
+
+
+class ChunkBuilder:
+    """Turns pages, in order, into chunks in the corpus schema | 按页顺序生成语料结构的文本块
+
+    Keeps the running chapter and section (a new chapter clears the
+    section), the next chunk number, each page's content hash and the
+    corpus statistics.
+    维护当前章、节（新章节会清空小节）、下一个文本块编号、每页内容哈希和语料统计。
+    """
+
+    def __init__(self):
+        self.chapter: Optional[str] = None
+        self.section: Optional[str] = None
+        self.next_id = 1
+        self.pages_seen = 0
+        self.pages_chunked: List[int] = []
+        self.pages_skipped: List[int] = []
+        self.page_hashes: Dict[int, str] = {}
+        self.total_words = 0
+        self.total_characters = 0
+        self.chunk_count = 0
+        self.chapters = set()
+        self.sections = set()
+        self.keywords = set()
+
+    def add_page(self, page_number: int, lines: Sequence[str]) -> List[Dict]:
+        """Chunks of one page | 一页的文本块"""
+        self.pages_seen += 1
+        chapter = next((line for line in lines if CHAPTER_PATTERN.match(line)), None)
+        if chapter is not None:
+            self.chapter, self.section = chapter, None
+        section = next((line for line in lines if is_section_heading(line)), None)
+        if section is not None:
+            self.section = section
+
+        words = ' '.join(lines).split()
+        self.page_hashes[page_number] = page_hash(words)
+        chunks = self._page_chunks(page_number, words)
+        (self.pages_chunked if chunks else self.pages_skipped).append(page_number)
+        for chunk in chunks:
+            self._count(chunk)
+        return chunks
+
+    def _page_chunks(self, page_number: int, words: Sequence[str]) -> List[Dict]:
+        return [self._chunk(page_number, window, self._new_chunk_id())
+                for window in chunk_windows(words)]
+
+    def _new_chunk_id(self) -> str:
+        chunk_id = f"chunk_{self.next_id:05d}"
+        self.next_id += 1
+        return chunk_id
+
+    def _chunk(self, page_number: int, window: Sequence[str], chunk_id: str) -> Dict:
+        text = ' '.join(window)
+        return {
+            'text': text,
+            'page': page_number,
+            'chapter': self.chapter,
+            'section': self.section,
+            'keywords': extract_keywords(text),
+            'word_count': len(window),
+            'char_count': len(text),
+            'chunk_id': chunk_id,
+            'source_page': page_number,
+        }
+
+    def _count(self, chunk: Dict) -> None:
+        self.chunk_count += 1
+        self.total_words += chunk['word_count']
+        self.total_characters += chunk['char_count']
+        if chunk['chapter'] is not None:
+            self.chapters.add(chunk['chapter'])
+        if chunk['section'] is not None:
+            self.sections.add(chunk['section'])
+        self.keywords.update(chunk['keywords'])
+
+    def metadata(self, source_file: str) -> Dict:
+        """Corpus metadata, as in family_law_chunks.json | 语料元数据（与 family_law_chunks.json 相同）"""
+        pages = self.pages_chunked
+        return {
+            'source_file': source_file,
+            'generated_at': datetime.now().isoformat(),
+            'chunking_config': {
+                'chunk_size': CHUNK_SIZE,
+                'overlap': CHUNK_OVERLAP,
+                'min_chunk_size': MIN_CHUNK_SIZE,
+            },
+            'statistics': {
+                'total_chunks': self.chunk_count,
+                'total_pages': len(pages),
+                'total_words': self.total_words,
+                'total_characters': self.total_characters,
+                'average_words_per_chunk': self.total_words / max(self.chunk_count, 1),
+                'average_chunks_per_page': self.chunk_count / max(len(pages), 1),
+                'page_range': f"{pages[0]}-{pages[-1]}" if pages else "",
+                'chapters_detected': len(self.chapters),
+                'unique_keywords': len(self.keywords),
+            },
+            'chapters': sorted(self.chapters),
+            'top_keywords': sorted(self.keywords)[:TOP_KEYWORDS],
+            # Compared by the next delta build | 供下一次增量构建比较
+            'page_hashes': {str(page): digest for page, digest in self.page_hashes.items()},
+        }
+
+
+class DeltaChunkBuilder(ChunkBuilder):
+    """ChunkBuilder that keeps the previous build's chunk_ids | 保留上一次构建 chunk_id 的 ChunkBuilder
+
+    A page whose content hash matches a previous page (wherever it moved)
+    is not re-chunked; its previous chunks are reused with the current
+    page, chapter and section. Other pages are re-chunked, and a window
+    whose text equals any previous chunk not yet carried over keeps that
+    chunk_id, so unchanged text keeps its id even in builds without page
+    hashes. Each such page is then matched to a previous page: the one most
+    of its unchanged windows came from, else by position next to the
+    matched pages around it. Remaining windows take that page's leftover
+    ids (modified) or new ids past the highest ever used (added). Previous
+    chunks not carried over are removed.
+    内容哈希与某个原页面相同的页面（无论是否移动）不重新切块，直接沿用原文本块并
+    更新页码、章、节。其他页面重新切块：文本与任一尚未沿用的原文本块相同的窗口沿用
+    其 chunk_id，因此即使旧构建没有页面哈希，未变的文本也保留id。随后每个这样的页面
+    与一个原页面匹配：优先取其未变窗口大多来自的页面，否则按相对于前后已匹配页面的
+    位置。其余窗口依次使用该原页面剩余的id（修改），或使用大于历史最大编号的新id
+    （新增）。未被沿用的原文本块即为删除。
+    """
+
+    def __init__(self, previous: Dict, pages: Sequence[Tuple[int, Sequence[str]]]):
+        super().__init__()
+        self.previous_pages: Dict[int, List[Dict]] = {}
+        for chunk in previous['chunks']:
+            self.previous_pages.setdefault(chunk['page'], []).append(chunk)
+        self.previous_ids = [chunk['chunk_id'] for chunk in previous['chunks']]
+        self.next_id = 1 + max((int(chunk_id.rsplit('_', 1)[1]) for chunk_id in self.previous_ids),
+                               default=0)
+        self.added: List[str] = []
+        self.modified: List[str] = []
+        self.pages_changed: List[int] = []
+        self._kept = set()
+
+        # Builds without page hashes (older corpora) skip this step
+        # 没有页面哈希的旧语料跳过这一步
+        pages_by_hash: Dict[str, List[int]] = {}
+        previous_hashes = previous.get('metadata', {}).get('page_hashes', {})
+        for page, digest in sorted((int(page), digest) for page, digest in previous_hashes.items()):
+            pages_by_hash.setdefault(digest, []).append(page)
+        # New page → (previous page, same content) | 新页面 → （原页面, 内容是否相同）
+        self.matches: Dict[int, Tuple[int, bool]] = {}
+        claimed = set()
+        for page_number, lines in pages:
+            candidates = pages_by_hash.get(page_hash(' '.join(lines).split()))
+            if candidates:
+                previous_page = page_number if page_number in candidates else candidates[0]
+                candidates.remove(previous_page)
+                claimed.add(previous_page)
+                self.matches[page_number] = (previous_page, True)
+
+        # Unchanged text anywhere keeps its chunk, decided for every page
+        # before any leftover id is handed out
+        # 任意位置未变的文本都沿用原文本块；在分配剩余id之前为所有页面确定
+        by_text: Dict[str, List[Dict]] = {}
+        for chunk in previous['chunks']:
+            if chunk['page'] not in claimed:
+                by_text.setdefault(chunk['text'], []).append(chunk)
+        # New page → previous chunk (or None) per window | 新页面 → 每个窗口对应的原文本块
+        self.window_matches: Dict[int, List[Optional[Dict]]] = {}
+        self._text_kept = set()
+        for page_number, lines in pages:
+            if page_number in self.matches:
+                continue
+            olds = []
+            for window in chunk_windows(' '.join(lines).split()):
+                same_text = by_text.get(' '.join(window))
+                olds.append(same_text.pop(0) if same_text else None)
+            self.window_matches[page_number] = olds
+            self._text_kept.update(old['chunk_id'] for old in olds if old is not None)
+            sources = Counter(old['page'] for old in olds if old is not None)
+            for previous_page, _ in sources.most_common():
+                if previous_page not in claimed:
+                    claimed.add(previous_page)
+                    self.matches[page_number] = (previous_page, False)
+                    break
+
+        # Pages with nothing unchanged take the previous page after the last
+        # match (pages inserted or removed earlier shift the numbers), else
+        # their own number
+        # 没有未变文本的页面优先匹配上一个已匹配页面之后的原页面（前面插入或删除
+        # 页面会使页码偏移），否则按相同页码匹配
+        last_previous = 0
+        for page_number, _ in pages:
+            if page_number in self.matches:
+                last_previous = self.matches[page_number][0]
+                continue
+            for previous_page in (last_previous + 1, page_number):
+                if previous_page in self.previous_pages and previous_page not in claimed:
+                    claimed.add(previous_page)
+                    self.matches[page_number] = (previous_page, False)
+                    last_previous = previous_page
+                    break
+
+    def _page_chunks(self, page_number: int, words: Sequence[str]) -> List[Dict]:
+        previous_page, unchanged = self.matches.get(page_number, (None, False))
+        pool = self.previous_pages.get(previous_page, [])
+        if unchanged:
+            chunks = [self._carry(page_number, pool_chunk) for pool_chunk in pool]
+            self._record(chunks, pool)
+            return chunks
+
+        windows = chunk_windows(words)
+        olds = list(self.window_matches[page_number])
+        if len(olds) != len(pool) or any(old is not chunk for old, chunk in zip(olds, pool)):
+            self.pages_changed.append(page_number)
+        # Ids of the matched page not kept by unchanged text anywhere
+        # 匹配页面中未被任何未变文本沿用的id
+        leftover = [old for old in pool if old['chunk_id'] not in self._text_kept]
+
+        chunks = []
+        for i, window in enumerate(windows):
+            if olds[i] is not None:
+                chunks.append(self._carry(page_number, olds[i]))
+            elif leftover:
+                olds[i] = leftover.pop(0)
+                chunks.append(self._chunk(page_number, window, olds[i]['chunk_id']))
+            else:
+                chunks.append(self._chunk(page_number, window, self._new_chunk_id()))
+                self.added.append(chunks[-1]['chunk_id'])
+        self._record(chunks, olds)
+        return chunks
+
+    def _carry(self, page_number: int, old: Dict) -> Dict:
+        """Previous chunk at its current location | 更新位置信息后的原文本块"""
+        return dict(old, page=page_number, source_page=page_number,
+                    chapter=self.chapter, section=self.section)
+
+    def _record(self, chunks: Sequence[Dict], olds: Sequence[Optional[Dict]]) -> None:
+        for chunk, old in zip(chunks, olds):
+            if old is None:
+                continue
+            self._kept.add(old['chunk_id'])
+            if chunk_content_hash(chunk) != chunk_content_hash(old):
+                self.modified.append(chunk['chunk_id'])
+
+    def change_set(self, from_version: str, to_version: str) -> Dict:
+        """chunk_ids added, modified and removed since the previous build | 相对上一次构建的变更集"""
+        return {
+            'from_version': from_version,
+            'to_version': to_version,
+            'generated_at': datetime.now().isoformat(),
+            'added': self.added,
+            'modified': self.modified,
+            'removed': [chunk_id for chunk_id in self.previous_ids if chunk_id not in self._kept],
+            'pages_changed': self.pages_changed,
+        }
+
+
+def iter_chunks(pdf_path: str, builder: ChunkBuilder, workers: Optional[int] = None) -> Iterator[Dict]:
+    """Chunks of a PDF, streamed as pages are extracted | 随页面提取流式产出PDF的文本块"""
+    for page_number, lines in iter_pages(pdf_path, workers):
+        yield from builder.add_page(page_number, lines)
+
+
+def _write_json_atomic(path: str, write) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _indent(text: str, prefix: str) -> str:
+    return '\n'.join(prefix + line for line in text.splitlines())
+
+
+def write_corpus(path: str, chunks: Iterator[Dict], builder: ChunkBuilder,
+                 source_file: str) -> None:
+    """Stream chunks to disk, then write the corpus JSON atomically | 流式写出文本块后原子写入语料JSON
+
+    Produces the same layout as json.dump(data, indent=2, ensure_ascii=False),
+    with the metadata (known only at the end) before the chunks.
+    输出与 json.dump(data, indent=2, ensure_ascii=False) 相同的布局，元数据（结束时
+    才能确定）位于文本块之前。
+    """
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        separator = ''
+        for chunk in chunks:
+            spool.write(separator + _indent(json.dumps(chunk, indent=2, ensure_ascii=False), '    '))
+            separator = ',\n'
+        spool.seek(0)
+
+        def write(f):
+            metadata = json.dumps(builder.metadata(source_file), indent=2, ensure_ascii=False)
+            f.write('{\n  "metadata": ' + _indent(metadata, '  ').lstrip() + ',\n')
+            f.write('  "chunks": [\n')
+            shutil.copyfileobj(spool, f)
+            f.write('\n  ]\n}' if separator else '  ]\n}')
+
+        _write_json_atomic(path, write)
+
+
+def extraction_stats(builder: ChunkBuilder, workers: int, elapsed: float) -> Dict:
+    """Summary written to extraction_stats.json | 写入 extraction_stats.json 的摘要"""
+    stats = {
+        'total_chunks': builder.chunk_count,
+        'chapters': sorted(builder.chapters),
+        'sections': sorted(builder.sections),
+        'pages_in_pdf': builder.pages_seen,
+        'pages_covered': len(builder.pages_chunked),
+        'pages_skipped': builder.pages_skipped,
+        'total_words': builder.total_words,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'pages_per_second': round(builder.pages_seen / elapsed, 1) if elapsed else None,
+    }
+    if isinstance(builder, DeltaChunkBuilder):
+        stats['pages_changed'] = len(builder.pages_changed)
+        stats['chunks_added'] = len(builder.added)
+        stats['chunks_modified'] = len(builder.modified)
+    return stats
+
+
+def ingest(pdf_path: str, output_path: str, stats_path: Optional[str] = None,
+           workers: Optional[int] = None, previous_path: Optional[str] = None,
+           changes_path: Optional[str] = None) -> Dict:
+    """Extract, chunk and write a corpus; returns the extraction stats | 提取、切块并写出语料，返回提取统计
+
+    With ``previous_path`` (the last build's chunks JSON, which may also be
+    ``output_path``) this is a delta build: chunk_ids are kept where the text
+    is unchanged and the change set is written to ``changes_path`` (default:
+    next to the output, see corpus_store.load_change_set). All pages are
+    still extracted, since hashing a page needs its text, but only changed
+    pages are re-chunked, and downstream stores only touch the chunks listed.
+    指定 previous_path（上一次构建的语料JSON，可与 output_path 相同）时为增量构建：
+    文本未变的文本块保留 chunk_id，变更集写入 changes_path（默认在输出文件旁，见
+    corpus_store.load_change_set）。计算页面哈希需要页面文本，因此仍提取所有页面，
+    但只重新切分变化的页面，下游存储也只处理变更集中列出的文本块。
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if previous_path is None:
+        builder = ChunkBuilder()
+        chunks = iter_chunks(pdf_path, builder, workers)
+    else:
+        with open(previous_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        from_version = corpus_version(previous_path)
+        # Matching moved pages needs every page's hash first
+        # 匹配移动过的页面需要先得到所有页面的哈希
+        pages = list(iter_pages(pdf_path, workers))
+        builder = DeltaChunkBuilder(previous, pages)
+        chunks = (chunk for page_number, lines in pages
+                  for chunk in builder.add_page(page_number, lines))
+    write_corpus(output_path, chunks, builder, os.path.basename(pdf_path))
+
+    stats = extraction_stats(builder, workers, time.perf_counter() - start)
+    if previous_path is not None:
+        change_set = builder.change_set(from_version, corpus_version(output_path))
+        _write_json_atomic(changes_path or default_changes_path(output_path),
+                           lambda f: json.dump(change_set, f, indent=2, ensure_ascii=False))
+        stats['chunks_removed'] = len(change_set['removed'])
+    if stats_path:
+        _write_json_atomic(stats_path, lambda f: json.dump(stats, f, indent=2, ensure_ascii=False))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF → 文本块（并行流式提取）")
+    parser.add_argument('pdf', help="源PDF文件")
+    parser.add_argument('--output', default='family_law_chunks.json', help="输出语料JSON")
+    parser.add_argument('--stats', default='extraction_stats.json', help="输出提取统计JSON")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数（默认CPU数）")
+    parser.add_argument('--previous', default=None,
+                        help="上一次构建的语料JSON：增量构建，保留未变文本块的 chunk_id")
+    parser.add_argument('--changes', default=None,
+                        help="变更集输出路径（默认为 <output>.changes.json）")
+    args = parser.parse_args()
+
+    print(f"📄 提取 {args.pdf} ...")
+    stats = ingest(args.pdf, args.output, args.stats, args.workers,
+                   previous_path=args.previous, changes_path=args.changes)
+    print(f"✅ 已写入 {args.output}: {stats['total_chunks']} 个文本块, "
+          f"{stats['pages_covered']}/{stats['pages_in_pdf']} 页, "
+          f"{stats['workers']} 个进程, {stats['elapsed_seconds']:.1f}s "
+          f"({stats['pages_per_second']} 页/秒)")
+    if args.previous:
+        print(f"🔄 增量: {stats['pages_changed']} 页变化, 新增 {stats['chunks_added']}, "
+              f"修改 {stats['chunks_modified']}, 删除 {stats['chunks_removed']} 个文本块")
+
+
+if __name__ == "__main__":
+    main()
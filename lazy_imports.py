@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deferred imports of heavy optional dependencies
+按需导入较重的可选依赖
+
+anthropic, chromadb and sentence_transformers (which pulls in torch) take
+from a few hundred milliseconds to several seconds to import. They are
+imported through ``require`` the first time a feature needs them, never at
+module load, so search-only paths start without them. Each first import is
+timed: the duration is kept in IMPORT_TIMES and recorded as an 'import'
+span in the active trace. Nothing here installs packages; a missing
+dependency raises ImportError naming the pip package to install.
+anthropic、chromadb 和 sentence_transformers（会加载torch）导入需数百毫秒到数秒。
+它们在功能首次需要时通过 require 导入，而不是在模块加载时导入，因此仅检索的路径
+启动时不加载它们。每次首次导入都会计时：耗时保存在 IMPORT_TIMES 中，并在当前trace
+中记录为 'import' span。这里不会安装任何包；缺少依赖时抛出 ImportError 并给出pip包名。
+
+``python3 lazy_imports.py`` measures the cold import cost of each module in
+a fresh interpreter.
+运行 ``python3 lazy_imports.py`` 在全新解释器中测量各模块的冷启动导入耗时。
+"""
+
+import sys
+import time
+import importlib
+import subprocess
+from typing import Dict
+
+from timing import span
+
+# Module → pip package, for the install hint | 模块名 → pip包名（用于安装提示）
+PIP_PACKAGES = {
+    'anthropic': 'anthropic',
+    'chromadb': 'chromadb',
+    'pdfplumber': 'pdfplumber',
+    'sentence_transformers': 'sentence-transformers',
+}
+
+# Seconds spent on each first import in this process | 本进程中各模块首次导入的耗时（秒）
+IMPORT_TIMES: Dict[str, float] = {}
+
+
+def require(module_name: str, feature: str):
+    """Import a module on first use, timing it | 首次使用时导入模块并计时
+
+    ``feature`` names what needs the module, for the error message.
+    feature 为需要该模块的功能名称，用于错误信息。
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    try:
+        with span('import', module=module_name):
+            module = importlib.import_module(module_name)
+    except ImportError as e:
+        package = PIP_PACKAGES.get(module_name, module_name)
+        raise ImportError(f"{feature} needs {module_name}: pip install {package}") from e
+    IMPORT_TIMES[module_name] = time.perf_counter() - start
+    return module
+
+
+def import_report() -> str:
+    """One line of first-import durations, slowest first | 首次导入耗时（按耗时降序）"""
+    items = sorted(IMPORT_TIMES.items(), key=lambda item: item[1], reverse=True)
+    return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in items)
+
+
+def measure_cold_import(module_name: str) -> float:
+    """Seconds to import a module in a fresh interpreter | 在全新解释器中导入模块的耗时（秒）"""
+    code = ("import time; start = time.perf_counter(); "
+            f"import {module_name}; print(time.perf_counter() - start)")
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1] if completed.stderr else module_name)
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """Print the cold import cost of startup and heavy modules | 打印启动模块与重量级模块的冷导入耗时"""
+    modules = sys.argv[1:] or [
+        'search_index', 'spelling', 'bm25', 'family_law_agent_prototype',
+        'streamlit', 'anthropic', 'chromadb', 'sentence_transformers',
+    ]
+    print(f"{'module':<30} {'cold import':>12}")
+    for module_name in modules:
+        try:
+            print(f"{module_name:<30} {measure_cold_import(module_name) * 1000:>10.1f}ms")
+        except ImportError as e:
+            print(f"{module_name:<30} {'unavailable':>12}  ({e})")
+
+
+if __name__ == "__main__":
+    main()
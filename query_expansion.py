@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline Chinese → English query expansion
+离线中文→英文查询扩展
+
+The corpus is English, so a Chinese question never matches the keyword
+index. ZH_EN_TERMS maps Chinese legal terms to English terms from the
+corpus vocabulary (the chunks' ``keywords`` plus the wording of the book).
+It is seeded from the Chinese example questions in LANGUAGES. The expander
+scans the query once with a character trie, taking the longest match at
+each position ("子女抚养费" wins over "子女"), and appends the English terms
+to the query. No network call, and the cost is a few dictionary lookups.
+语料为英文，中文问题无法匹配关键词索引。ZH_EN_TERMS 将中文法律术语映射为语料
+词汇中的英文词（来自文本块 keywords 及书中用语），以 LANGUAGES 中的中文示例问题
+为种子。扩展器用字符trie对查询扫描一次，每个位置取最长匹配，并把英文词追加到
+查询后。无网络调用，开销仅为几次字典查找。
+
+Check the table against the corpus: python3 query_expansion.py
+"""
+
+import re
+import sys
+from typing import Dict, List, Sequence
+
+# Chinese term → English corpus terms | 中文术语 → 语料中的英文词
+ZH_EN_TERMS: Dict[str, Sequence[str]] = {
+    # Marriage, separation and divorce | 婚姻、分居与离婚
+    '离婚': ('divorce',),
+    '离婚令': ('divorce', 'order'),
+    '分居': ('separation', 'separated'),
+    '同一屋檐下分居': ('separation', 'under', 'one', 'roof'),
+    '婚姻': ('marriage',),
+    '结婚': ('marriage', 'married'),
+    '已婚': ('married',),
+    '事实婚姻': ('de', 'facto', 'relationship'),
+    '事实婚姻关系': ('de', 'facto', 'relationship'),
+    '事实伴侣': ('de', 'facto', 'partner'),
+    '同居': ('de', 'facto', 'cohabitation'),
+    '伴侣': ('partner',),
+    '配偶': ('spouse',),
+    '丈夫': ('husband',),
+    '妻子': ('wife',),
+    '关系': ('relationship',),
+    '和解': ('reconciliation',),
+    '婚前协议': ('binding', 'financial', 'agreement'),
+    # Property | 财产
+    '财产': ('property',),
+    '财产分割': ('property', 'settlement', 'division'),
+    '财产和解': ('property', 'settlement'),
+    '分割': ('division', 'split'),
+    '资产': ('assets',),
+    '负债': ('liabilities',),
+    '债务': ('debts', 'liabilities'),
+    '退休金': ('superannuation', 'super', 'splitting'),
+    '养老金': ('superannuation', 'pension'),
+    '房子': ('home', 'house'),
+    '房产': ('property', 'real', 'estate'),
+    '住宅': ('home', 'residence'),
+    '婚姻住所': ('matrimonial', 'home'),
+    '出售': ('sale',),
+    '信托': ('trust',),
+    '公司': ('company',),
+    '生意': ('business',),
+    '企业': ('business', 'company'),
+    '贡献': ('contributions',),
+    '财务': ('financial',),
+    '财务协议': ('financial', 'agreement'),
+    '有约束力的财务协议': ('binding', 'financial', 'agreement'),
+    '收入': ('income',),
+    '估值': ('valuation', 'value'),
+    '价值': ('value',),
+    '比例': ('percentage',),
+    '未来需求': ('future', 'needs'),
+    '一次性': ('lump', 'sum'),
+    # Children | 子女
+    '子女': ('child', 'children'),
+    '孩子': ('child', 'children'),
+    '儿童': ('child', 'children'),
+    '继子女': ('step', 'child'),
+    '抚养权': ('custody', 'parenting', 'parental', 'responsibility'),
+    '监护权': ('custody', 'parental', 'responsibility'),
+    '育儿令': ('parenting', 'orders'),
+    '抚养令': ('parenting', 'orders'),
+    '育儿计划': ('parenting', 'plan'),
+    '父母责任': ('parental', 'responsibility'),
+    '共同父母责任': ('equal', 'shared', 'parental', 'responsibility'),
+    '最佳利益': ('best', 'interests'),
+    '抚养费': ('child', 'support'),
+    '子女抚养费': ('child', 'support', 'assessment'),
+    '赡养费': ('maintenance',),
+    '配偶赡养费': ('spousal', 'maintenance'),
+    '探视': ('spend', 'time'),
+    '同住': ('live', 'with'),
+    '搬迁': ('relocation',),
+    '迁居': ('relocation',),
+    '绑架': ('abduction',),
+    '诱拐': ('abduction',),
+    '海牙公约': ('hague', 'convention'),
+    '亲子鉴定': ('parentage', 'testing'),
+    '亲子关系': ('parentage',),
+    '生父': ('paternity', 'father'),
+    '父亲': ('father',),
+    '母亲': ('mother',),
+    '父母': ('parents',),
+    '祖父母': ('grandparents',),
+    '学校': ('school',),
+    '出生': ('birth',),
+    '家庭报告': ('family', 'report'),
+    '独立儿童律师': ('independent', 'children', 'lawyer'),
+    # Violence and safety | 家庭暴力与安全
+    '家庭暴力': ('family', 'violence'),
+    '家暴': ('family', 'violence'),
+    '暴力': ('violence',),
+    '虐待': ('abuse',),
+    '保护令': ('protection', 'order'),
+    '禁制令': ('injunction',),
+    '风险': ('risk',),
+    '安全': ('safety',),
+    # Courts and procedure | 法院与程序
+    '法院': ('court',),
+    '法庭': ('court',),
+    '家庭法院': ('family', 'court'),
+    '联邦巡回法院': ('federal', 'circuit', 'court'),
+    '法官': ('judge',),
+    '登记官': ('registrar',),
+    '流程': ('procedure', 'process'),
+    '程序': ('procedure', 'proceedings'),
+    '诉讼': ('proceedings',),
+    '申请': ('application', 'apply'),
+    '申请人': ('applicant',),
+    '答辩人': ('respondent',),
+    '同意令': ('consent', 'orders'),
+    '命令': ('order', 'orders'),
+    '临时': ('interim',),
+    '最终': ('final',),
+    '开庭': ('hearing',),
+    '听证': ('hearing',),
+    '审判': ('trial',),
+    '判决': ('judgment', 'decision'),
+    '决定': ('decision',),
+    '上诉': ('appeal',),
+    '证据': ('evidence',),
+    '宣誓书': ('affidavit',),
+    '文件': ('documents',),
+    '表格': ('forms', 'form'),
+    '送达': ('service',),
+    '披露': ('disclosure',),
+    '费用': ('costs', 'fees'),
+    '律师费': ('costs', 'lawyer', 'fees'),
+    '律师': ('lawyer', 'solicitor'),
+    '法律援助': ('legal', 'aid'),
+    '法律建议': ('legal', 'advice'),
+    '调解': ('family', 'dispute', 'resolution', 'mediation'),
+    '家庭纠纷解决': ('family', 'dispute', 'resolution'),
+    '咨询': ('counselling', 'advice'),
+    '变更': ('variation', 'vary'),
+    '撤销': ('set', 'aside'),
+    '执行': ('enforcement',),
+    '违反': ('contravention', 'breach'),
+    '管辖权': ('jurisdiction',),
+    '期限': ('time', 'limit'),
+    # Question words that carry meaning | 有实际含义的疑问/描述词
+    '条件': ('requirements', 'grounds'),
+    '理由': ('grounds',),
+    '因素': ('factors',),
+    '计算': ('calculation', 'assessment'),
+    '评估': ('assessment',),
+    '多长时间': ('time', 'months'),
+    '多久': ('time', 'months'),
+    '困难': ('hardship',),
+    '权利': ('rights',),
+    '责任': ('responsibility',),
+    '澳大利亚': ('australia',),
+}
+
+_CJK = re.compile(r'[一-鿿]')
+_END = ''  # Trie key marking the end of a term | trie中标记词尾的键
+
+
+class QueryExpander:
+    """Longest-match zh→en expansion over a character trie | 基于字符trie的最长匹配扩展"""
+
+    def __init__(self, table: Dict[str, Sequence[str]] = ZH_EN_TERMS):
+        self.trie: Dict = {}
+        for term, english in table.items():
+            node = self.trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[_END] = tuple(english)
+
+    def english_terms(self, query: str) -> List[str]:
+        """English terms for the Chinese parts of a query, deduplicated | 查询中文部分对应的英文词"""
+        terms = []
+        i = 0
+        while i < len(query):
+            node = self.trie
+            match, match_end = None, i
+            j = i
+            while j < len(query) and query[j] in node:
+                node = node[query[j]]
+                j += 1
+                if _END in node:
+                    match, match_end = node[_END], j
+            if match:
+                terms.extend(match)
+                i = match_end
+            else:
+                i += 1
+        return list(dict.fromkeys(terms))
+
+    def expand(self, query: str) -> str:
+        """Query plus English terms; English-only queries are returned unchanged | 返回追加英文词的查询"""
+        if not _CJK.search(query):
+            return query
+        terms = self.english_terms(query)
+        return f"{query} {' '.join(terms)}" if terms else query
+
+
+_default_expander = None
+
+
+def expand_query(query: str) -> str:
+    """Expand with the built-in table (trie built on first use) | 使用内置词表扩展查询"""
+    global _default_expander
+    if _default_expander is None:
+        _default_expander = QueryExpander()
+    return _default_expander.expand(query)
+
+
+def main():
+    """Report table terms that never occur in the corpus | 检查词表中语料未出现的英文词"""
+    from corpus_store import load_chunks
+    from search_index import tokenize
+
+    chunks_path = sys.argv[1] if len(sys.argv) > 1 else 'family_law_chunks.json'
+    chunks = load_chunks(chunks_path)
+    vocabulary = set()
+    for chunk in chunks:
+        vocabulary.update(tokenize(chunk['text']))
+        vocabulary.update(chunk.get('keywords') or [])
+
+    missing = sorted({
+        f"{term} → {word}"
+        for term, english in ZH_EN_TERMS.items()
+        for word in english if word not in vocabulary
+    })
+    print(f"📖 词表 {len(ZH_EN_TERMS)} 个中文术语，语料词汇 {len(vocabulary)} 个")
+    if missing:
+        print(f"⚠️  {len(missing)} 个英文词未出现在语料中:")
+        for item in missing:
+            print(f"   {item}")
+    else:
+        print("✅ 所有英文词均出现在语料中")
+
+
+if __name__ == "__main__":
+    main()
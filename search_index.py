@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyword search index for the Family Law knowledge base
+家庭法知识库关键词搜索索引
+"""
+
+import re
+import heapq
+from array import array
+from typing import List, Dict, Iterable, Optional, Sequence
+
+from facets import FacetIndex, SearchFilter
+from timing import span
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# Score of one matched term: +2 plus its frequency in the chunk
+# 单个匹配词的得分：+2 加词频
+TERM_MATCH_SCORE = 2
+PHRASE_MATCH_SCORE = 10
+# Proximity bonus per extra query term found together, divided by the
+# number of other tokens in between plus one
+# 邻近度加分：每多一个共同出现的查询词加分，再除以间隔词数加一
+PROXIMITY_MATCH_SCORE = 4
+
+# "Quoted" phrases, straight or curly quotes | 引号短语（直引号或弯引号）
+QUOTED_PHRASE_PATTERN = re.compile(r'["\u201c\u201d]([^"\u201c\u201d]+)["\u201c\u201d]')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens | 将文本切分为小写词元"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace, for cache keys | 转小写并合并空白，用作缓存键"""
+    return ' '.join(query.lower().split())
+
+
+def quoted_phrases(query: str) -> List[List[str]]:
+    """Tokens of each "quoted" phrase in a query | 查询中每个引号短语的词元"""
+    phrases = (tokenize(phrase) for phrase in QUOTED_PHRASE_PATTERN.findall(query))
+    return [tokens for tokens in phrases if tokens]
+
+
+class PositionalIndex:
+    """Token positions of each term in each chunk | 每个词在每个文本块中的词元位置
+
+    Phrase and proximity queries are answered by intersecting position lists,
+    so no chunk text is scanned at query time. The character offsets of every
+    token are kept too (``offsets[doc_id]`` holds start, end pairs), so
+    snippets can be cut and highlighted without re-tokenizing.
+    短语和邻近查询通过位置列表求交回答，查询时不扫描任何文本。同时保存每个词元的
+    字符偏移（offsets[doc_id] 依次存放起止位置），生成摘要和高亮时无需重新切词。
+    """
+
+    def __init__(self, texts_lower: Iterable[str]):
+        self.positions: Dict[str, Dict[int, List[int]]] = {}
+        self.offsets: List[array] = []
+        for doc_id, text_lower in enumerate(texts_lower):
+            bounds = array('I')
+            for pos, match in enumerate(TOKEN_PATTERN.finditer(text_lower)):
+                self.positions.setdefault(match.group(), {}).setdefault(doc_id, []).append(pos)
+                bounds.extend(match.span())
+            self.offsets.append(bounds)
+
+    def phrase_matches(self, tokens: Sequence[str]) -> set:
+        """Chunks containing the tokens consecutively | 连续包含这些词元的文本块"""
+        if not tokens or any(term not in self.positions for term in tokens):
+            return set()
+        # Rarest term first keeps the candidate set small
+        # 最少见的词在前，候选集最小
+        order = sorted(range(len(tokens)), key=lambda i: len(self.positions[tokens[i]]))
+        docs = set(self.positions[tokens[order[0]]])
+        for i in order[1:]:
+            docs &= self.positions[tokens[i]].keys()
+        if len(tokens) == 1:
+            return docs
+
+        matches = set()
+        for doc_id in docs:
+            # Phrase start positions consistent with every token so far
+            # 与已检查词元均一致的短语起始位置
+            starts = None
+            for i in order:
+                shifted = {pos - i for pos in self.positions[tokens[i]][doc_id]}
+                starts = shifted if starts is None else starts & shifted
+                if not starts:
+                    break
+            if starts:
+                matches.add(doc_id)
+        return matches
+
+    def min_window(self, doc_id: int, terms: Sequence[str]) -> Optional[int]:
+        """Shortest token span containing all terms in one chunk | 文本块中包含所有词的最短跨度
+
+        Returns None if the chunk lacks any of the terms.
+        文本块缺少任一词时返回None。
+        """
+        lists = []
+        for term in terms:
+            doc_positions = self.positions.get(term, {}).get(doc_id)
+            if doc_positions is None:
+                return None
+            lists.append(doc_positions)
+
+        # Sliding window over the merged, sorted position lists
+        # 在合并排序后的位置列表上滑动窗口
+        events = sorted((pos, i) for i, doc_positions in enumerate(lists) for pos in doc_positions)
+        counts = [0] * len(lists)
+        covered = 0
+        best = None
+        left = 0
+        for pos, i in events:
+            counts[i] += 1
+            if counts[i] == 1:
+                covered += 1
+            while covered == len(lists):
+                left_pos, left_term = events[left]
+                width = pos - left_pos + 1
+                if best is None or width < best:
+                    best = width
+                counts[left_term] -= 1
+                if counts[left_term] == 0:
+                    covered -= 1
+                left += 1
+        return best
+
+
+class InvertedIndex:
+    """Inverted index over text chunks | 文本块倒排索引
+
+    Built once at load time. Each term maps to its postings: the positions of
+    the chunks containing it, with the per-chunk term frequency. Each term
+    also keeps the highest score it can add to any chunk, which lets search
+    skip chunks that cannot reach the top k (MaxScore). A positional index
+    answers phrase and proximity scoring, and facet bitmaps answer chapter,
+    section and page filters.
+    加载时构建一次。每个词映射到包含它的文本块及其词频；并记录该词对任一文本块
+    的最高得分，搜索时据此跳过不可能进入前k的文本块（MaxScore）。短语和邻近度
+    评分由位置索引回答；章、节、页码过滤由分面位图回答。
+    """
+
+    def __init__(self, chunks: List[Dict]):
+        self.chunks = chunks
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+        texts_lower = []
+        for doc_id, chunk in enumerate(chunks):
+            text_lower = chunk['text'].lower()
+            texts_lower.append(text_lower)
+            for term in set(TOKEN_PATTERN.findall(text_lower)):
+                # Substring count, matching the original scoring exactly
+                # 使用子串计数，与原评分完全一致
+                self.postings.setdefault(term, {})[doc_id] = text_lower.count(term)
+
+        self.max_scores: Dict[str, int] = {
+            term: TERM_MATCH_SCORE + max(docs.values()) for term, docs in self.postings.items()
+        }
+
+        self.positional = PositionalIndex(texts_lower)
+        self.facets = FacetIndex(chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def phrase_matches(self, phrase: str) -> set:
+        """Chunks containing the phrase's tokens consecutively | 连续包含短语词元的文本块"""
+        return self.positional.phrase_matches(tokenize(phrase))
+
+    def proximity_score(self, doc_id: int, terms: Sequence[str]) -> int:
+        """Bonus for query terms found close together | 查询词彼此靠近的加分
+
+        ``terms`` are distinct query terms that all occur in the chunk.
+        terms 为均出现在该文本块中的不同查询词。
+        """
+        if len(terms) < 2:
+            return 0
+        gap = self.positional.min_window(doc_id, terms) - len(terms)
+        return PROXIMITY_MATCH_SCORE * (len(terms) - 1) // (gap + 1)
+
+    def search(self, query: str, n_results: int = 5,
+               search_filter: Optional[SearchFilter] = None) -> List[Dict]:
+        """Top-k chunks with MaxScore pruning | 使用MaxScore剪枝的前k检索
+
+        A chunk scores +10 if it contains the whole query as a phrase, +2 per
+        matched term plus term frequency, and a proximity bonus for matched
+        terms close together; ties are in corpus order. "Quoted" phrases in
+        the query are required: only chunks containing every one of them are
+        returned. ``search_filter`` likewise limits the candidates to a
+        chapter, section or page range before any scoring.
+        完整查询作为短语出现+10分，每个匹配词+2分再加词频，匹配词彼此靠近另有邻近度
+        加分；同分按语料顺序。查询中的“引号短语”为必需条件：只返回包含所有引号短语
+        的文本块。search_filter 同样在评分前把候选限定在指定章、节或页码范围内。
+
+        Terms are scored one at a time, highest maximum score first. The k-th
+        best partial score is a lower bound on the final k-th score (the
+        threshold); once the maximum score of the remaining terms plus the
+        largest proximity bonus falls below it, chunks not yet seen cannot
+        enter the top k, so the long postings of common terms are only probed
+        for the current candidates, and candidates that can no longer reach
+        the threshold are dropped. Proximity is then computed best candidate
+        first, stopping once the rest cannot enter the heap of the top k.
+        按最高得分从高到低逐词评分；第k高的部分得分是最终第k名得分的下界（阈值）。
+        一旦剩余词的最高得分加最大邻近度加分低于阈值，尚未出现的文本块不可能进入前k，
+        因此常见词的长倒排列表只需为现有候选查找，无法再达到阈值的候选被丢弃。随后
+        从最佳候选开始计算邻近度，其余候选无法进入前k堆时即停止。
+        """
+        if n_results <= 0:
+            return []
+        with span('tokenize'):
+            query_lower = query.lower()
+            query_tokens = TOKEN_PATTERN.findall(query_lower)
+            required_phrases = quoted_phrases(query_lower)
+
+        # Chunks passing the filter and holding every quoted phrase are the
+        # only candidates, and whole-query phrase chunks start with their
+        # +10, which raises the threshold early
+        # 仅通过过滤且包含所有引号短语的文本块为候选；完整查询短语匹配的文本块
+        # 先计+10分，尽早抬高阈值
+        with span('filter'):
+            allowed = self.facets.allowed_docs(search_filter)
+            required = set(allowed) if allowed is not None else None
+        with span('phrase'):
+            for tokens in required_phrases:
+                matches = self.positional.phrase_matches(tokens)
+                required = matches if required is None else required & matches
+            scores: Dict[int, int] = dict.fromkeys(required or (), 0)
+            for doc_id in self.positional.phrase_matches(query_tokens):
+                if required is None or doc_id in required:
+                    scores[doc_id] = PHRASE_MATCH_SCORE
+
+        with span('score'):
+            terms = sorted((term for term in set(query_tokens) if term in self.postings),
+                           key=lambda term: -self.max_scores[term])
+            max_proximity = PROXIMITY_MATCH_SCORE * max(len(terms) - 1, 0)
+            # Best score the terms not yet scored, plus proximity, can still add
+            # 尚未评分的词加邻近度最多还能增加的得分
+            remaining = sum(self.max_scores[term] for term in terms) + max_proximity
+            # Upper bound on any partial score, so the threshold is only
+            # computed once it could exceed `remaining`
+            # 部分得分的上界：仅当阈值可能超过 remaining 时才计算阈值
+            scored_max = PHRASE_MATCH_SCORE if scores else 0
+            threshold = None
+            for term in terms:
+                postings = self.postings[term]
+                remaining -= self.max_scores[term]
+                # An unseen chunk scores at most max_scores[term] + remaining;
+                # a tie could still win on corpus order, hence strict <
+                # 未出现的文本块最多得 max_scores[term] + remaining；同分仍可能按
+                # 语料顺序胜出，因此用严格小于
+                if required is None and (threshold is None
+                                         or self.max_scores[term] + remaining >= threshold):
+                    for doc_id, tf in postings.items():
+                        scores[doc_id] = scores.get(doc_id, 0) + TERM_MATCH_SCORE + tf
+                elif len(postings) < len(scores):
+                    # Walk whichever side is shorter | 遍历较短的一方
+                    for doc_id, tf in postings.items():
+                        if doc_id in scores:
+                            scores[doc_id] += TERM_MATCH_SCORE + tf
+                else:
+                    for doc_id in scores:
+                        tf = postings.get(doc_id)
+                        if tf is not None:
+                            scores[doc_id] += TERM_MATCH_SCORE + tf
+
+                scored_max += self.max_scores[term]
+                if scored_max > remaining and len(scores) >= n_results:
+                    threshold = heapq.nlargest(n_results, scores.values())[-1]
+                    if remaining < threshold:
+                        scores = {doc_id: score for doc_id, score in scores.items()
+                                  if score + remaining >= threshold}
+
+        # Entries are (score, -doc_id): the smallest is the weakest of the top k
+        # 堆元素为 (得分, -文档号)，堆顶为前k中最弱者
+        with span('proximity'):
+            heap: List = []
+            candidates = sorted(((score, -doc_id) for doc_id, score in scores.items()
+                                 if score > 0), reverse=True)
+            for score, neg_doc_id in candidates:
+                if len(heap) == n_results and (score + max_proximity, neg_doc_id) < heap[0]:
+                    break
+                if max_proximity:
+                    present = [term for term in terms if -neg_doc_id in self.postings[term]]
+                    # Tighter bound from the terms this chunk actually has
+                    # 按该文本块实际包含的词得到更紧的上界
+                    bound = PROXIMITY_MATCH_SCORE * max(len(present) - 1, 0)
+                    if len(heap) == n_results and (score + bound, neg_doc_id) < heap[0]:
+                        continue
+                    score += self.proximity_score(-neg_doc_id, present)
+                entry = (score, neg_doc_id)
+                if len(heap) < n_results:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        # Highest score first, ties in corpus order (same as a stable sort)
+        with span('sort'):
+            top = sorted(heap, reverse=True)
+        return [{'chunk': self.chunks[-neg_doc_id], 'score': score} for score, neg_doc_id in top]
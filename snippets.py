@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query-focused snippets with highlighted matches
+面向查询的摘要片段与匹配高亮
+
+Token positions and character offsets come from the PositionalIndex built
+at load time, so a snippet needs no regex and no re-tokenizing: the query
+terms' positions in the chunk are merged, a sliding window picks the run of
+``max_tokens`` tokens covering the most (rarest-weighted) distinct terms,
+and the text is cut and marked up in one pass over the hits in that window.
+词元位置和字符偏移来自加载时构建的 PositionalIndex，生成摘要无需正则或重新切词：
+合并查询词在文本块中的位置，滑动窗口选出覆盖最多（按稀有度加权）不同查询词的
+max_tokens 个词元，再在窗口内的匹配上一次遍历完成截取和高亮。
+"""
+
+import html
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from search_index import PositionalIndex, tokenize
+
+# Default snippet length in tokens (about 400 characters) | 默认摘要长度（词元数，约400字符）
+SNIPPET_TOKENS = 60
+# Single letters, and terms in most chunks (the, for, of...), are not
+# highlighted | 单个字母及出现在大多数文本块中的词（the、for、of等）不高亮
+MIN_TERM_LENGTH = 2
+COMMON_TERM_FRACTION = 0.7
+ELLIPSIS = '…'
+
+
+class SnippetGenerator:
+    """Best-matching window of a chunk, with query terms marked | 文本块中最匹配的片段并标记查询词
+
+    ``positional`` is the search engine's PositionalIndex over the same
+    chunks (InvertedIndex.positional / BM25Index.positional); one is built
+    if not given. Read-only after construction.
+    positional 为搜索引擎基于同一批文本块的 PositionalIndex；未提供时自行构建。
+    构建后只读。
+    """
+
+    def __init__(self, chunks: Sequence[Dict], positional: Optional[PositionalIndex] = None):
+        self.positional = positional or PositionalIndex(chunk['text'].lower() for chunk in chunks)
+        self.doc_ids = {chunk['chunk_id']: doc_id for doc_id, chunk in enumerate(chunks)}
+        self.size = len(chunks)
+
+    def _terms(self, query: str) -> List[Tuple[str, float]]:
+        """Distinct, not too common query terms, with IDF weights | 不过于常见的不同查询词及其IDF权重"""
+        terms = []
+        for term in dict.fromkeys(tokenize(query)):
+            docs = self.positional.positions.get(term)
+            if (docs and len(term) >= MIN_TERM_LENGTH
+                    and len(docs) <= COMMON_TERM_FRACTION * self.size):
+                terms.append((term, math.log(1 + self.size / len(docs))))
+        return terms
+
+    def _window(self, hits: List[Tuple[int, int]], weights: List[float],
+                n_tokens: int, max_tokens: int) -> Tuple[int, int]:
+        """Token range [start, end) of the best window | 最佳窗口的词元范围 [start, end)"""
+        if not hits:
+            return 0, min(n_tokens, max_tokens)
+        counts = [0] * len(weights)
+        score = 0.0
+        best = None
+        left = 0
+        for right, (pos, term) in enumerate(hits):
+            if counts[term] == 0:
+                score += weights[term]
+            counts[term] += 1
+            while pos - hits[left][0] >= max_tokens:
+                left_term = hits[left][1]
+                counts[left_term] -= 1
+                if counts[left_term] == 0:
+                    score -= weights[left_term]
+                left += 1
+            # Distinct terms first, then more hits; earliest wins ties
+            # 先比不同词的权重，再比匹配数；同分取最靠前的窗口
+            key = (score, right - left)
+            if best is None or key > best[0]:
+                best = (key, left, right)
+
+        _, left, right = best
+        first, last = hits[left][0], hits[right][0]
+        # Center the matches in the window | 匹配居中
+        start = max(0, first - (max_tokens - (last - first + 1)) // 2)
+        end = min(n_tokens, start + max_tokens)
+        return max(0, end - max_tokens), end
+
+    def snippet(self, chunk: Dict, query: str, max_tokens: int = SNIPPET_TOKENS,
+                open_tag: str = '<mark>', close_tag: str = '</mark>',
+                escape: Callable[[str], str] = html.escape) -> str:
+        """Snippet of ``chunk`` for ``query`` with matches wrapped in tags | 生成带高亮标记的摘要
+
+        ``query`` should be the query as searched (corrected and expanded).
+        Text is HTML-escaped by default; pass ``escape=str`` for plain text.
+        query 应为实际检索用的查询（已纠错和扩展）。默认对文本做HTML转义；
+        纯文本输出可传 escape=str。
+        """
+        text = chunk['text']
+        doc_id = self.doc_ids.get(chunk.get('chunk_id'))
+        if doc_id is None or len(text.lower()) != len(text):
+            # Unknown chunk, or lowercasing moved the offsets: plain prefix
+            # 未知文本块，或转小写改变了偏移：返回无高亮的开头部分
+            words = text.split()
+            suffix = ' ' + ELLIPSIS if len(words) > max_tokens else ''
+            return escape(' '.join(words[:max_tokens])) + suffix
+
+        offsets = self.positional.offsets[doc_id]
+        n_tokens = len(offsets) // 2
+        if n_tokens == 0:
+            return escape(text)
+        terms = self._terms(query)
+        hits = sorted(
+            (pos, i)
+            for i, (term, _) in enumerate(terms)
+            for pos in self.positional.positions[term].get(doc_id, ())
+        )
+        start, end = self._window(hits, [weight for _, weight in terms], n_tokens, max_tokens)
+
+        text_start = offsets[2 * start] if start > 0 else 0
+        text_end = offsets[2 * end - 1] if end < n_tokens else len(text)
+        parts = [ELLIPSIS + ' '] if start > 0 else []
+        cursor = text_start
+        for pos, _ in hits:
+            if start <= pos < end:
+                token_start, token_end = offsets[2 * pos], offsets[2 * pos + 1]
+                parts.append(escape(text[cursor:token_start]))
+                parts.append(open_tag + escape(text[token_start:token_end]) + close_tag)
+                cursor = token_end
+        parts.append(escape(text[cursor:text_end]))
+        if end < n_tokens:
+            parts.append(' ' + ELLIPSIS)
+        return ''.join(parts)
+
+    def annotate(self, results: List[Dict], query: str,
+                 max_tokens: int = SNIPPET_TOKENS) -> List[Dict]:
+        """Copies of search results with an HTML 'snippet' added | 为搜索结果添加HTML摘要（返回副本）"""
+        return [{**result, 'snippet': self.snippet(result['chunk'], query, max_tokens)}
+                for result in results]
@@ -2,57 +2,70 @@
 # -*- coding: utf-8 -*-
 """
 家庭法AI代理 - 简单测试（无需API密钥）
-仅使用向量检索功能
+仅使用向量检索功能（--numpy 使用进程内NumPy向量索引代替Chroma）
 """
 
-import json
-import os
 import sys
 
 # 添加主脚本路径
 sys.path.insert(0, '/home/claude')
 
-print("📦 安装依赖...")
-os.system("pip install chromadb sentence-transformers --break-system-packages -q")
-
-import chromadb
-from sentence_transformers import SentenceTransformer
+from corpus_store import load_chunks
+from query_expansion import expand_query
+from embedding_store import EmbeddingStore, QueryEncoder
+# 重量级依赖在首次使用时才导入（不在启动时pip安装）
+from lazy_imports import require
 
 class SimpleFamilyLawSearch:
-    def __init__(self):
+    def __init__(self, vector_backend: str = "chroma"):
         self.chunks = None
         self.collection = None
         self.model = None
+        self.vector_backend = vector_backend
         
     def load_data(self):
         """加载数据"""
         print("\n📖 加载知识库...")
-        with open('/home/claude/family_law_chunks.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        self.chunks = data['chunks']
+        self.chunks = load_chunks('/home/claude/family_law_chunks.json')
         print(f"✅ 已加载 {len(self.chunks)} 个文本块")
         
     def load_model(self):
         """加载嵌入模型"""
         print("\n🤖 加载嵌入模型...")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        sentence_transformers = require('sentence_transformers', "嵌入模型")
+        self.model = sentence_transformers.SentenceTransformer('all-MiniLM-L6-v2')
+        # 与 family_law_agent_prototype.py 共用的磁盘嵌入缓存
+        self.embedding_store = EmbeddingStore('/home/claude/embedding_cache', 'all-MiniLM-L6-v2')
+        # 查询也用同一个模型编码（带LRU缓存）
+        self.query_encoder = QueryEncoder(self.model)
         print("✅ 模型加载完成")
         
     def create_database(self):
         """创建向量数据库"""
         print("\n💾 创建向量数据库...")
         
-        self.client = chromadb.PersistentClient(path="/home/claude/family_law_db_test")
-        
-        try:
-            self.collection = self.client.get_collection("family_law")
-            print("✅ 找到现有数据库")
-            return
-        except:
-            pass
+        if self.vector_backend == "numpy":
+            from vector_index import NumpyVectorIndex
+            
+            self.collection = NumpyVectorIndex.load("/home/claude/family_law_db_test/family_law.npz")
+            if self.collection.count():
+                print("✅ 找到现有索引")
+                return
+        else:
+            chromadb = require('chromadb', "Chroma向量数据库")
+            
+            self.client = chromadb.PersistentClient(path="/home/claude/family_law_db_test")
+            
+            try:
+                self.collection = self.client.get_collection("family_law")
+                print("✅ 找到现有数据库")
+                return
+            except:
+                pass
+            
+            self.collection = self.client.create_collection(name="family_law")
         
         print("  创建新数据库并索引文档...")
-        self.collection = self.client.create_collection(name="family_law")
         
         # 分批索引
         batch_size = 100
@@ -62,12 +75,12 @@ class SimpleFamilyLawSearch:
             ids = [c['chunk_id'] for c in batch]
             docs = [c['text'] for c in batch]
             metas = [{
-                'page': c['page_number'],
-                'chapter': c.get('chapter', '')[:200],
-                'type': c['content_type']
+                'page': c['page'],
+                'chapter': (c.get('chapter') or '')[:200],
+                'section': (c.get('section') or '')[:200]
             } for c in batch]
             
-            embeddings = self.model.encode(docs, show_progress_bar=False)
+            embeddings = self.embedding_store.encode(self.model, docs)
             
             self.collection.add(
                 ids=ids,
@@ -78,12 +91,14 @@ class SimpleFamilyLawSearch:
             
             print(f"  ✓ {min(i+batch_size, len(self.chunks))}/{len(self.chunks)}")
         
+        if self.vector_backend == "numpy":
+            self.collection.save()
         print("✅ 索引完成")
         
     def search(self, query: str, n: int = 5):
-        """搜索相关内容"""
+        """搜索相关内容（中文术语先扩展为英文词）"""
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=[self.query_encoder.encode(expand_query(query)).tolist()],
             n_results=n
         )
         
@@ -96,7 +111,7 @@ class SimpleFamilyLawSearch:
             
             print("="*80)
             print(f"【结果 #{i+1}】相关度: {(1-distance)*100:.1f}%")
-            print(f"页码: {meta['page']} | 类型: {meta['type']}")
+            print(f"页码: {meta['page']} | 小节: {meta['section'][:50]}")
             print(f"章节: {meta['chapter'][:70]}...")
             print(f"\n{doc[:500]}...")
             print()
@@ -107,7 +122,9 @@ def main():
     print("   (不需要API密钥，仅语义搜索)")
     print("="*80)
     
-    searcher = SimpleFamilyLawSearch()
+    searcher = SimpleFamilyLawSearch(
+        vector_backend="numpy" if "--numpy" in sys.argv[1:] else "chroma"
+    )
     searcher.load_data()
     searcher.load_model()
     searcher.create_database()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+BM25Index tests
+BM25Index 测试
+"""
+
+import pytest
+
+pytest.importorskip('scipy')
+
+from bm25 import BM25Index
+
+
+def _chunks(texts):
+    return [{'chunk_id': f"c{i}", 'page': i + 1, 'text': text} for i, text in enumerate(texts)]
+
+
+def test_ties_at_the_cutoff_are_broken_by_corpus_order():
+    texts = ['custody of the children'] * 40 + ['children'] * 5
+    index = BM25Index(_chunks(texts))
+
+    for k in (1, 3, 10):
+        results = index.search('custody', n_results=k)
+        assert [r['chunk']['chunk_id'] for r in results] == [f"c{i}" for i in range(k)]
+
+
+def test_search_many_matches_search():
+    index = BM25Index(_chunks(['property settlement', 'child support', 'property pool',
+                               'spousal support', 'the property of the parties']))
+    queries = ['property', 'support', 'property support']
+    assert index.search_many(queries, k=3) == [index.search(q, n_results=3) for q in queries]
+
+
+def test_terms_close_together_rank_first():
+    texts = [
+        'the child lives with the mother and support is paid by the father',
+        'child support is paid by the father to the mother who lives here',
+    ]
+    index = BM25Index(_chunks(texts))
+
+    results = index.search('child support', n_results=2)
+    assert [r['chunk']['chunk_id'] for r in results] == ['c1', 'c0']
+    assert results[0]['score'] > results[1]['score']
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Corpus store tests
+语料存储测试
+"""
+
+import json
+import os
+
+import pytest
+
+from corpus_store import CorpusStore, build_corpus, default_corpus_path, load_chunks
+
+
+def _chunk(i, **fields):
+    chunk = {
+        'text': f"Text of chunk {i}", 'page': i + 1, 'chapter': 'CHAPTER ONE',
+        'section': None, 'keywords': ['custody'], 'word_count': 4, 'char_count': 15,
+        'chunk_id': f"chunk_{i:04d}", 'source_page': i + 1,
+    }
+    chunk.update(fields)
+    return chunk
+
+
+def _write(tmp_path, chunks):
+    path = os.path.join(tmp_path, 'chunks.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': {}, 'chunks': chunks}, f)
+    return path
+
+
+def test_build_and_read_back(tmp_path):
+    chunks = [_chunk(i) for i in range(3)]
+    store = CorpusStore(build_corpus(_write(tmp_path, chunks)))
+    assert [dict(record) for record in store] == chunks
+
+
+@pytest.mark.parametrize('value', [None, -1, 2 ** 32, 1.5, '3'])
+def test_build_rejects_invalid_page(tmp_path, value):
+    path = _write(tmp_path, [_chunk(0), _chunk(1, page=value)])
+    with pytest.raises(ValueError, match='page'):
+        build_corpus(path)
+    assert not os.path.exists(default_corpus_path(path))
+
+
+def test_load_falls_back_to_json_for_a_none_page(tmp_path):
+    chunks = [_chunk(0), _chunk(1, page=None)]
+    chunks_loaded = load_chunks(_write(tmp_path, chunks))
+    assert chunks_loaded == chunks
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+FacetIndex tests
+FacetIndex 测试
+"""
+
+from facets import FacetIndex, SearchFilter
+
+
+def _bits(bitmap):
+    return [i for i in range(bitmap.bit_length()) if bitmap >> i & 1]
+
+
+def test_bitmaps_hold_the_chunks_of_each_value():
+    records = [{'chapter': f"C{i % 3}", 'section': 'S' if i % 4 == 0 else None, 'page': 50 - i}
+               for i in range(50)]
+    facets = FacetIndex(records)
+
+    for value in ('C0', 'C1', 'C2'):
+        assert _bits(facets.chapters[value]) == [i for i in range(50) if f"C{i % 3}" == value]
+    assert _bits(facets.sections['S']) == list(range(0, 50, 4))
+    # Pages run backwards, so the range is not one run of bits
+    # 页码倒序，页码范围不是一段连续的位
+    assert _bits(facets.page_range(10, 12)) == [38, 39, 40]
+    assert facets.allowed_docs(SearchFilter(chapters=['C1'], pages=(10, 20))) == [31, 34, 37, 40]
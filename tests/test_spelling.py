@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+SpellCorrector tests against the real corpus
+基于真实语料的 SpellCorrector 测试
+"""
+
+import pytest
+
+from corpus_store import load_chunks
+from spelling import SpellCorrector
+
+# Common English words the book never uses, drawn at random from a general
+# word-frequency list and not used to choose the correction thresholds
+# 书中未出现的常用英语词，从通用词频表中随机抽取，未用于确定纠错阈值
+HELD_OUT_VALID_WORDS = """
+academy acceptable acids agenda articulate aspire athlete atomic audrey austrian aviation
+ballistic barr bedford beneath betty bing blessings bombings brewers bulldogs burgess
+caretaker channel chaotic cheeky chic chronicles civilians clicks coastline coffin colours
+commentators concerts conditioning congress courthouse creations crossings dams demolition
+diner disable doorway dropping earl earrings eccentric emerald experiments falcons
+fascination faux fearing firearm folklore footprint forks framing fundraiser gamma gardner
+gear getty glacier glow gonzalez graphical guinness habitats hangs harmless harvested
+heather herald heroic honda hoops idiot inclined indifferent juan kazakhstan khan lahore
+lawsuit loneliness lorenzo louis lumber mapped massage memoir metre miraculous moderate
+mont nsfw olympic optic orphans performer photographer pickup picture planner pleasures
+poles pouring premiership preparatory pulled raging recipe rectangular reeves renting
+rested revised rites rubbed runners samuel schizophrenia season seminary sheila silently
+sizes skirts slid spear starbucks station stellar surprised surrounds switches tastes
+teasing thor ukraine universe viktor violet ware warmth whale wheels
+""".split()
+
+TYPOS = {
+    'superanuation': 'superannuation',
+    'custodey': 'custody',
+    'propperty': 'property',
+    'setlement': 'settlement',
+    'divorse': 'divorce',
+    'seperation': 'separation',
+    'childern': 'children',
+    'maintenence': 'maintenance',
+    'arrangments': 'arrangements',
+    'afidavit': 'affidavit',
+    'jurisdicton': 'jurisdiction',
+    'defacto': 'de facto',
+}
+
+
+@pytest.fixture(scope='module')
+def corrector():
+    return SpellCorrector.from_chunks(load_chunks('family_law_chunks.json'))
+
+
+def test_held_out_valid_words_are_rarely_rewritten(corrector):
+    words = [w for w in HELD_OUT_VALID_WORDS if w not in corrector.word_counts]
+    assert len(words) == len(HELD_OUT_VALID_WORDS)
+    rewritten = [w for w in words if corrector.correct(w) != w]
+    assert len(rewritten) <= 0.02 * len(words), rewritten
+
+
+@pytest.mark.parametrize('query', [
+    'my husband cheated',
+    'take the dogs overseas',
+    'whats the cooling off period',
+    'can my ex move interstate with the kids',
+    'doctors reports',
+])
+def test_everyday_queries_are_unchanged(corrector, query):
+    assert corrector.correct(query) == query
+    assert corrector.expand(query) == query
+
+
+@pytest.mark.parametrize('typo, expected', sorted(TYPOS.items()))
+def test_typos_of_book_terms_are_corrected(corrector, typo, expected):
+    assert corrector.correct(typo) == expected
+    assert corrector.expand(typo) == f"{typo} {expected}"
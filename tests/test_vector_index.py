@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+NumpyVectorIndex tests
+NumpyVectorIndex 测试
+"""
+
+import numpy as np
+
+from vector_index import NumpyVectorIndex
+
+
+def _records(ids):
+    vectors = np.eye(8, dtype=np.float32)[[int(i[1:]) for i in ids]]
+    documents = [f"text {i}" for i in ids]
+    metadatas = [{'page': int(i[1:]), 'chunk_id': i} for i in ids]
+    return vectors, documents, metadatas
+
+
+def _upsert(index, ids):
+    vectors, documents, metadatas = _records(ids)
+    index.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+
+def test_upsert_batches_map_ids_to_their_rows():
+    index = NumpyVectorIndex()
+    _upsert(index, ['c0', 'c1', 'c2'])
+    _upsert(index, ['c3', 'c4', 'c1'])
+
+    assert index.count() == 5
+    got = index.get(ids=['c4', 'c0', 'c3', 'c1'])
+    assert got['ids'] == ['c4', 'c0', 'c3', 'c1']
+    assert got['documents'] == ['text c4', 'text c0', 'text c3', 'text c1']
+    assert [m['chunk_id'] for m in got['metadatas']] == got['ids']
+
+
+def test_delete_after_upsert_batches_removes_the_right_rows():
+    index = NumpyVectorIndex()
+    _upsert(index, ['c0', 'c1', 'c2'])
+    _upsert(index, ['c3', 'c4', 'c5'])
+
+    index.delete(['c1', 'c4'])
+
+    assert index.get()['ids'] == ['c0', 'c2', 'c3', 'c5']
+    assert index.get()['documents'] == ['text c0', 'text c2', 'text c3', 'text c5']
+    # Each remaining id still returns its own vector | 剩余id仍对应自己的向量
+    for chunk_id in ['c0', 'c2', 'c3', 'c5']:
+        vector, _, _ = _records([chunk_id])
+        assert index.query(vector, n_results=1)['ids'] == [[chunk_id]]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight per-stage timing spans
+轻量级分阶段计时
+
+A request is wrapped in ``trace(name)`` and its stages in ``span(name)``.
+Spans record their start offset, duration and nesting depth in the active
+trace. When the trace ends it is emitted as one JSON line. The active trace
+lives in a context variable, so concurrent Streamlit sessions never mix.
+When no trace is active, ``span`` costs one context-variable lookup and
+returns a shared no-op context manager.
+请求用 trace(name) 包裹，各阶段用 span(name) 包裹。span 在当前trace中记录起始偏移、
+耗时和嵌套深度，trace结束时输出一行JSON。当前trace保存在上下文变量中，并发会话互不
+干扰；没有活动trace时，span 只做一次上下文变量查找并返回共享的空上下文管理器。
+
+Enable with FAMILY_LAW_TIMING=1. Records go to stderr, or are appended to
+the file named by FAMILY_LAW_TIMING_FILE.
+设置 FAMILY_LAW_TIMING=1 启用；记录输出到stderr，或追加到 FAMILY_LAW_TIMING_FILE 指定的文件。
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ENABLED = os.environ.get('FAMILY_LAW_TIMING', '').lower() in ('1', 'true', 'yes', 'on')
+TIMING_FILE = os.environ.get('FAMILY_LAW_TIMING_FILE')
+
+_NULL = nullcontext()
+_current: contextvars.ContextVar = contextvars.ContextVar('family_law_trace', default=None)
+_depth: contextvars.ContextVar = contextvars.ContextVar('family_law_span_depth', default=0)
+_emit_lock = threading.Lock()
+
+
+class Trace:
+    """Spans of one request | 单个请求的计时记录"""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans: List[Dict] = []
+        self.started_at = datetime.now().isoformat(timespec='milliseconds')
+        self._start = time.perf_counter()
+        self.total_ms: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace': self.name,
+            'started_at': self.started_at,
+            'total_ms': self.total_ms,
+            **self.attrs,
+            # Appended as spans finish; listed in start order | 按开始时间排序
+            'spans': sorted(self.spans, key=lambda entry: entry['start_ms']),
+        }
+
+
+def enable(enabled: bool = True) -> None:
+    """Turn JSON timing records on or off for this process | 开启或关闭计时记录"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def _emit(trace_obj: Trace) -> None:
+    line = json.dumps(trace_obj.to_dict(), ensure_ascii=False)
+    with _emit_lock:
+        if TIMING_FILE:
+            with open(TIMING_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        else:
+            print(line, file=sys.stderr, flush=True)
+
+
+@contextmanager
+def _trace(name: str, emit: bool, attrs: Dict):
+    trace_obj = Trace(name, **attrs)
+    token = _current.set(trace_obj)
+    try:
+        yield trace_obj
+    finally:
+        trace_obj.total_ms = round((time.perf_counter() - trace_obj._start) * 1000, 3)
+        _current.reset(token)
+        if emit:
+            _emit(trace_obj)
+
+
+def trace(name: str, enabled: Optional[bool] = None, **attrs):
+    """Time one request | 对一个请求计时
+
+    ``enabled`` overrides the process-wide switch for this request (e.g. a
+    sidebar toggle); such traces are collected but only emitted when timing
+    is enabled process-wide. Yields the Trace, or None when disabled.
+    enabled 可针对单个请求覆盖全局开关（如侧边栏开关），此时只收集不输出，
+    仅在全局启用时输出JSON。禁用时返回 None。
+    """
+    if not (ENABLED if enabled is None else enabled):
+        return _NULL
+    if _current.get() is not None:
+        # Already inside a trace: its spans nest in the outer one
+        # 已在trace中：作为外层trace的一部分
+        return nullcontext(_current.get())
+    return _trace(name, ENABLED, attrs)
+
+
+@contextmanager
+def _span(trace_obj: Trace, name: str, attrs: Dict):
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _depth.reset(token)
+        trace_obj.spans.append({
+            'name': name,
+            'start_ms': round((start - trace_obj._start) * 1000, 3),
+            'duration_ms': round((end - start) * 1000, 3),
+            'depth': depth,
+            **attrs,
+        })
+
+
+def span(name: str, **attrs):
+    """Time one stage of the current request | 对当前请求的一个阶段计时"""
+    trace_obj = _current.get()
+    if trace_obj is None:
+        return _NULL
+    return _span(trace_obj, name, attrs)
+
+
+def traced(name: str):
+    """Decorator: run the function inside ``trace(name)`` | 装饰器：在 trace(name) 中运行函数"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_in_context(executor, fn, *args):
+    """executor.submit that carries the current trace into the worker thread | 将当前trace带入线程池"""
+    if _current.get() is None:
+        return executor.submit(fn, *args)
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process exact vector index backed by NumPy
+基于NumPy的进程内精确向量索引
+
+A drop-in replacement for the subset of the Chroma collection API that
+FamilyLawAgent uses (get / upsert / delete / count / query), with no
+database server, SQLite or HNSW warm-up. Vectors are L2-normalized float32
+rows; a query is one BLAS matrix-vector (or matrix-matrix for batches)
+product followed by argpartition top-k. The whole index is saved to and
+loaded from a single .npz file. Chroma-style ``where`` filters on chapter,
+section and page are answered from facet bitmaps, and only the allowed
+rows are scored.
+替代 FamilyLawAgent 所用的 Chroma collection 接口子集（get / upsert / delete /
+count / query），无需数据库、SQLite或HNSW预热。向量为L2归一化的float32行；
+查询是一次BLAS矩阵乘法加 argpartition 取前k个。整个索引保存为单个 .npz 文件。
+章、节、页码的 Chroma 风格 where 过滤由分面位图回答，只对允许的行评分。
+"""
+
+import os
+import json
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from facets import FacetIndex, SearchFilter, bitmap_to_array
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class NumpyVectorIndex:
+    """Exact cosine-similarity index | 精确余弦相似度索引
+
+    Distances are cosine distances (1 - cosine similarity), so callers that
+    show ``1 - distance`` as relevance get the cosine similarity.
+    距离为余弦距离（1 - 余弦相似度），调用方用 1 - distance 即得到相似度。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._rows: Dict[str, int] = {}
+        # Built on the first filtered query, dropped on every write
+        # 首次过滤查询时构建，每次写入后丢弃
+        self._facets: Optional[FacetIndex] = None
+
+    @classmethod
+    def load(cls, path: str) -> 'NumpyVectorIndex':
+        """Load from a .npz file, or start empty if it does not exist | 加载索引文件，不存在则新建"""
+        index = cls(path)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                index.embeddings = data['embeddings']
+                index.ids = data['ids'].tolist()
+                payload = json.loads(data['payload'].tobytes().decode('utf-8'))
+            index.documents = payload['documents']
+            index.metadatas = payload['metadatas']
+            index._rows = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+        return index
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the index to one .npz file (atomic) | 原子写入单个 .npz 文件"""
+        path = path or self.path
+        payload = json.dumps(
+            {'documents': self.documents, 'metadatas': self.metadatas},
+            ensure_ascii=False,
+        ).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    embeddings=self.embeddings,
+                    ids=np.asarray(self.ids, dtype=str),
+                    payload=np.frombuffer(payload, dtype=np.uint8),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.path = path
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, ids: Optional[Sequence[str]] = None, include: Sequence[str] = ('metadatas', 'documents')) -> Dict:
+        """Stored records, in Chroma's get() shape | 按 Chroma get() 格式返回记录"""
+        rows = range(len(self.ids)) if ids is None else [self._rows[i] for i in ids if i in self._rows]
+        result = {'ids': [self.ids[row] for row in rows]}
+        if 'metadatas' in include:
+            result['metadatas'] = [self.metadatas[row] for row in rows]
+        if 'documents' in include:
+            result['documents'] = [self.documents[row] for row in rows]
+        return result
+
+    def upsert(self, ids: Sequence[str], embeddings, documents: Sequence[str],
+               metadatas: Sequence[Dict]) -> None:
+        """Insert new records or replace existing ones | 插入或替换记录"""
+        vectors = _normalize_rows(embeddings)
+        if self.embeddings.size == 0:
+            self.embeddings = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+        new_rows = []
+        for chunk_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+            row = self._rows.get(chunk_id)
+            if row is None:
+                self._rows[chunk_id] = len(self.ids)
+                self.ids.append(chunk_id)
+                self.documents.append(document)
+                self.metadatas.append(dict(metadata))
+                new_rows.append(vector)
+            else:
+                self.embeddings[row] = vector
+                self.documents[row] = document
+                self.metadatas[row] = dict(metadata)
+        if new_rows:
+            self.embeddings = np.vstack([self.embeddings, np.stack(new_rows)])
+        self._facets = None
+
+    add = upsert
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove records by id | 按id删除记录"""
+        drop = {self._rows[i] for i in ids if i in self._rows}
+        if not drop:
+            return
+        keep = [row for row in range(len(self.ids)) if row not in drop]
+        self.embeddings = self.embeddings[keep]
+        self.ids = [self.ids[row] for row in keep]
+        self.documents = [self.documents[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._facets = None
+
+    def _allowed_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Rows passing a ``where`` filter, or None if it does not restrict | 通过 where 过滤的行"""
+        search_filter = SearchFilter.from_where(where)
+        if not search_filter:
+            return None
+        if self._facets is None:
+            self._facets = FacetIndex(self.metadatas)
+        bitmap = self._facets.select(search_filter)
+        if bitmap is None:
+            return None
+        return bitmap_to_array(bitmap, len(self.ids))
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None) -> Dict:
+        """Top-k nearest records for each query, in Chroma's query() shape | 每个查询的前k个最近记录
+
+        All queries are scored with a single matrix-matrix product. With
+        ``where`` (chapter / section / page, as in Chroma), only the rows
+        passing the filter are multiplied.
+        所有查询通过一次矩阵乘法完成评分。指定 where（章/节/页码，同 Chroma）时，
+        只对通过过滤的行做乘法。
+        """
+        queries = _normalize_rows(query_embeddings)
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        rows = self._allowed_rows(where)
+        embeddings = self.embeddings if rows is None else self.embeddings[rows]
+        k = min(n_results, len(embeddings))
+        if k <= 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+
+        similarities = queries @ embeddings.T
+        if k < len(embeddings):
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(embeddings)), (len(queries), 1))
+
+        for query_row, candidates in enumerate(top):
+            scores = similarities[query_row, candidates]
+            order = candidates[np.argsort(-scores, kind='stable')]
+            # Positions among the scored rows → index rows | 评分行位置 → 索引行号
+            index_rows = order if rows is None else rows[order]
+            result['ids'].append([self.ids[row] for row in index_rows])
+            result['documents'].append([self.documents[row] for row in index_rows])
+            result['metadatas'].append([self.metadatas[row] for row in index_rows])
+            result['distances'].append([float(1 - similarities[query_row, i]) for i in order])
+        return result